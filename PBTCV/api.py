@@ -9,9 +9,12 @@ from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime, timedelta
 import os
+import logging
 import jwt
 from multi_user_database import MultiUserDB
 
+logger = logging.getLogger(__name__)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Family Budget Tracker API",
@@ -86,6 +89,19 @@ class ExpenseRequest(BaseModel):
     payment_mode: Optional[str] = None
     payment_details: Optional[str] = None
 
+class ExpenseItem(BaseModel):
+    date: str  # YYYY-MM-DD
+    category: str
+    subcategory: Optional[str] = None
+    amount: float
+    comment: Optional[str] = None
+    payment_mode: Optional[str] = None
+    payment_details: Optional[str] = None
+
+class BulkExpenseRequest(BaseModel):
+    user_id: int
+    expenses: List[ExpenseItem]
+
 class CopyAllocationsRequest(BaseModel):
     user_id: int
     from_year: int
@@ -255,7 +271,7 @@ def create_family_public(request: FamilyRegistrationRequest):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in family registration: {str(e)}")
+        logger.exception("Error in family registration")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create family: {str(e)}"
@@ -326,11 +342,12 @@ def toggle_household(household_id: int, current_user: dict = Depends(verify_jwt_
         is_active = bool(current_status)
         new_status = not is_active
         
-        print(f"DEBUG: Toggling household {household_id} status: {is_active} -> {new_status}")
+        logger.debug("Toggling household %s status: %s -> %s", household_id, is_active, new_status)
         
         # Update status
         db._execute(cursor, 'UPDATE households SET is_active = ? WHERE id = ?', (new_status, household_id))
         db.conn.commit()
+        db.invalidate_caches()
         
         return {
             "status": "success", 
@@ -342,9 +359,7 @@ def toggle_household(household_id: int, current_user: dict = Depends(verify_jwt_
         raise
     except Exception as e:
         db.conn.rollback()
-        print(f"Error toggling household: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error toggling household")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to toggle household status: {str(e)}"
@@ -403,9 +418,7 @@ def get_all_households(current_user: dict = Depends(verify_jwt_token)):
             }
         }
     except Exception as e:
-        print(f"ERROR in get_all_households: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_all_households")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch households: {str(e)}"
@@ -447,9 +460,7 @@ def get_all_users_admin(current_user: dict = Depends(verify_jwt_token)):
             }
         }
     except Exception as e:
-        print(f"ERROR in get_all_users_admin: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_all_users_admin")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch users: {str(e)}"
@@ -596,9 +607,7 @@ def get_household_members_list(
             }
         }
     except Exception as e:
-        print(f"ERROR in get_household_members: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_household_members")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch members: {str(e)}"
@@ -746,7 +755,7 @@ def get_household_detail(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR in get_household_detail: {str(e)}")
+        logger.exception("Error in get_household_detail")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch household details: {str(e)}"
@@ -966,29 +975,8 @@ def get_income(
     """
     Get income records for a user
     """
-    income_result = db.get_income_with_ids(user_id)
-    
-    if hasattr(income_result, 'to_dict'):
-        income = income_result.to_dict('records') if not income_result.empty else []
-    else:
-        income = income_result if income_result else []
-    
-    # Filter by period if provided (same logic as expenses)
-    if year and month:
-        filtered = []
-        for item in income:
-            # Try both 'date' and 'Date' keys
-            date_val = item.get('Date') or item.get('date', '')
-            # Convert to string if it's a datetime object
-            if hasattr(date_val, 'strftime'):
-                date_str = date_val.strftime('%Y-%m-%d')
-            else:
-                date_str = str(date_val)
-            
-            # Check if date matches year-month pattern
-            if date_str.startswith(f"{year}-{month:02d}"):
-                filtered.append(item)
-        income = filtered
+    # Rows come straight from the cursor, already filtered by period in SQL
+    income = db.get_income_rows(user_id, year, month)
     
     return {
         "status": "success",
@@ -1015,7 +1003,8 @@ def add_income(request: IncomeRequest, current_user: dict = Depends(verify_jwt_t
     
     return {
         "status": "success",
-        "message": "Income added successfully"
+        "message": "Income added successfully",
+        "income_id": int(success)
     }
 
 @app.put("/api/income/{income_id}")
@@ -1136,6 +1125,7 @@ def recalculate_all_allocations(current_user: dict = Depends(verify_jwt_token)):
             updated_count += 1
         
         conn.commit()
+        db.invalidate_caches()
         
         return {
             "status": "success",
@@ -1144,9 +1134,7 @@ def recalculate_all_allocations(current_user: dict = Depends(verify_jwt_token)):
         }
         
     except Exception as e:
-        print(f"Error recalculating allocations: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error recalculating allocations")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to recalculate allocations: {str(e)}"
@@ -1190,12 +1178,11 @@ def recalculate_allocation_for_category(user_id: int, category: str, year: int,
         ''', (actual_spent, new_balance, allocation['id']))
         
         conn.commit()
+        db.invalidate_caches()
         print(f"Recalculated {category} {year}-{month:02d}: spent={actual_spent}, balance={new_balance}")
         
     except Exception as e:
-        print(f"Error in recalculate_allocation_for_category: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in recalculate_allocation_for_category")
 
 # ==================== Allocation Endpoints ====================
 
@@ -1354,47 +1341,40 @@ def get_expenses(
     """
     Get expenses for a user
     """
-    expenses_result = db.get_all_expenses(user_id)
-    
-    # Convert DataFrame to list of dicts if needed
-    if hasattr(expenses_result, 'to_dict'):
-        expenses = expenses_result.to_dict('records') if not expenses_result.empty else []
-    else:
-        expenses = expenses_result if expenses_result else []
-    
-    print(f"=== EXPENSES API DEBUG ===")
-    print(f"User ID: {user_id}, Year: {year}, Month: {month}")
-    print(f"Total expenses before filter: {len(expenses)}")
-    if expenses:
-        print(f"First expense keys: {list(expenses[0].keys())}")
-        print(f"First expense: {expenses[0]}")
-    
-    # Filter by period if provided
-    if year and month:
-        filtered = []
-        for e in expenses:
-            # Try both 'date' and 'Date' keys (case-sensitive)
-            date_val = e.get('Date') or e.get('date', '')
-            # Convert to string if it's a datetime object
-            if hasattr(date_val, 'strftime'):
-                date_str = date_val.strftime('%Y-%m-%d')
-            else:
-                date_str = str(date_val)
-            
-            print(f"Checking expense: date_val={date_val}, date_str={date_str}, looking for {year}-{month:02d}")
-            
-            # Check if date matches year-month pattern
-            if date_str.startswith(f"{year}-{month:02d}"):
-                filtered.append(e)
-                print(f"  -> MATCH!")
-        expenses = filtered
-        print(f"After filter: {len(expenses)} expenses")
+    # Rows come straight from the cursor, already filtered by period in SQL
+    expenses = db.get_expense_rows(user_id, year, month)
     
     return {
         "status": "success",
         "data": expenses
     }
 
+@app.get("/api/expenses/{user_id}/page")
+def get_expenses_page(
+    user_id: int,
+    limit: int = 50,
+    before_date: Optional[str] = None,
+    before_id: Optional[int] = None,
+    current_user: dict = Depends(verify_jwt_token)
+):
+    """
+    Get one page of expenses for a user, newest first
+    Pass the Date and id of the last row as before_date/before_id to get the next page
+    """
+    limit = min(max(limit, 1), 500)
+    before = (before_date, before_id) if before_date and before_id else None
+    expenses = db.get_expenses_page(user_id, limit, before)
+    next_cursor = None
+    if len(expenses) == limit:
+        last = expenses[-1]
+        next_cursor = {"before_date": str(last["Date"]), "before_id": last["id"]}
+    
+    return {
+        "status": "success",
+        "data": expenses,
+        "next": next_cursor
+    }
+
 @app.post("/api/expenses")
 def add_expense(request: ExpenseRequest, current_user: dict = Depends(verify_jwt_token)):
     """
@@ -1425,11 +1405,33 @@ def add_expense(request: ExpenseRequest, current_user: dict = Depends(verify_jwt
         year, month = int(request.date[:4]), int(request.date[5:7])
         recalculate_allocation_for_category(request.user_id, request.category, year, month)
     except Exception as e:
-        print(f"Warning: Failed to recalculate allocation: {e}")
+        logger.warning("Failed to recalculate allocation: %s", e)
+    
+    return {
+        "status": "success",
+        "message": "Expense added successfully",
+        "expense_id": int(success)
+    }
+
+@app.post("/api/expenses/bulk")
+def add_expenses_bulk(request: BulkExpenseRequest, current_user: dict = Depends(verify_jwt_token)):
+    """
+    Add several expenses in one transaction (e.g. an offline queue synced from mobile)
+    """
+    # dict(model) works on both pydantic 1.x (pinned in requirements.txt) and 2.x
+    expense_ids = db.add_expenses_batch(request.user_id, [dict(e) for e in request.expenses])
+    
+    if expense_ids is False:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to add expenses"
+        )
     
+    # No per-category recalculation: the alloc_spent triggers already updated the allocations
     return {
         "status": "success",
-        "message": "Expense added successfully"
+        "message": f"{len(expense_ids)} expenses added successfully",
+        "expense_ids": [int(i) for i in expense_ids]
     }
 
 @app.put("/api/expenses/{expense_id}")
@@ -1484,7 +1486,7 @@ def update_expense(
         year, month = int(request.date[:4]), int(request.date[5:7])
         recalculate_allocation_for_category(request.user_id, request.category, year, month)
     except Exception as e:
-        print(f"Warning: Failed to recalculate allocation: {e}")
+        logger.warning("Failed to recalculate allocation: %s", e)
     
     return {
         "status": "success",
@@ -1534,7 +1536,7 @@ def delete_expense(expense_id: int, current_user: dict = Depends(verify_jwt_toke
         year, month = int(date[:4]), int(date[5:7])
         recalculate_allocation_for_category(user_id, category, year, month)
     except Exception as e:
-        print(f"Warning: Failed to recalculate allocation: {e}")
+        logger.warning("Failed to recalculate allocation: %s", e)
     
     return {
         "status": "success",
@@ -1572,7 +1574,7 @@ def get_savings_years(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR in get_savings_years: {str(e)}")
+        logger.exception("Error in get_savings_years")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch savings years: {str(e)}"
@@ -1622,9 +1624,7 @@ def get_monthly_liquidity(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR in get_monthly_liquidity: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_monthly_liquidity")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch monthly liquidity: {str(e)}"
@@ -1671,9 +1671,10 @@ def add_household_member(
         db._execute(cursor, '''
             INSERT INTO users (household_id, full_name, email, password_hash, role, relationship, created_at)
             VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (household_id, request.name, request.email, temp_password, 'member', request.relationship))
+        ''', (household_id, request.name, request.email, db._hash_password(temp_password), 'member', request.relationship))
         
         db.conn.commit()
+        db.invalidate_caches()
         
         # Get the created user id
         member_id = cursor.lastrowid if not db.use_postgres else cursor.fetchone()['id'] if db.use_postgres else cursor.lastrowid
@@ -1695,9 +1696,7 @@ def add_household_member(
         raise
     except Exception as e:
         db.conn.rollback()
-        print(f"Error adding member: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error adding member")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to add member: {str(e)}"
@@ -1745,6 +1744,7 @@ def delete_user(
         db._execute(cursor, 'DELETE FROM users WHERE id = ?', (user_id,))
         
         db.conn.commit()
+        db.invalidate_caches()
         
         return {
             "status": "success",
@@ -1755,9 +1755,7 @@ def delete_user(
         raise
     except Exception as e:
         db.conn.rollback()
-        print(f"Error deleting user: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error deleting user")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete user: {str(e)}"
@@ -310,6 +310,8 @@ def show_admin_login():
                 if success and user_data.get('role') == 'admin':
                     st.session_state.logged_in = True
                     st.session_state.user = user_data
+                    # Warm the dashboard's liquidity lookups in one query
+                    db.prefetch_liquidity(user_data['household_id'], user_data['id'], True)
                     st.session_state.login_page = None  # Reset navigation
                     st.success(f"Welcome, {user_data['full_name']}!")
                     st.rerun()
@@ -345,6 +347,8 @@ def show_member_login():
                 if success and user_data.get('role') == 'member':
                     st.session_state.logged_in = True
                     st.session_state.user = user_data
+                    # Warm the dashboard's liquidity lookups in one query
+                    db.prefetch_liquidity(user_data['household_id'], user_data['id'], False)
                     st.session_state.login_page = None  # Reset navigation
                     st.success(f"Welcome, {user_data['full_name']}!")
                     st.rerun()
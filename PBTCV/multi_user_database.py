@@ -4,15 +4,63 @@ Handles all database operations with user authentication and data isolation
 """
 import sqlite3
 import hashlib
+import logging
 import secrets
 import os
+import re
+import io
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import pandas as pd
+import sqlparse
+import time
+from functools import lru_cache
+from collections import OrderedDict
+from contextlib import closing, contextmanager
 from datetime import datetime
 from sqlalchemy import create_engine
 from sqlalchemy.pool import NullPool
 
+logger = logging.getLogger(__name__)
+logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+def _month_bounds(year, month):
+    """Return ('YYYY-MM-01', first day of next month) for a sargable date range filter"""
+    start = f"{int(year)}-{int(month):02d}-01"
+    next_year, next_month = (int(year) + 1, 1) if int(month) == 12 else (int(year), int(month) + 1)
+    end = f"{next_year}-{next_month:02d}-01"
+    return start, end
+
+def _expense_params(user_id, expense):
+    """Parameters for SQL_INSERT_EXPENSE (EXPENSE_COLUMNS order) from an expense dict"""
+    date = expense['date']
+    return (user_id, int(date[:4]), int(date[5:7]), date, expense['category'], float(expense['amount']),
+            expense.get('comment'), expense.get('subcategory'), expense.get('payment_mode'), expense.get('payment_details'))
+
+def _copy_text(value):
+    """Encode one value for PostgreSQL's COPY text format"""
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+@lru_cache(maxsize=256)
+def _hash_password_cached(password):
+    """Raw 32-byte SHA256 digest of a password, memoized for repeated logins on Streamlit reruns"""
+    return hashlib.sha256(password.encode()).digest()
+
+def _text_nulls_as_none(df):
+    """Turn pd.NA back into None in text columns that have NULLs"""
+    # Callers test optional fields like comment or subcategory for truthiness, which pd.NA refuses
+    for column in df.columns:
+        if pd.api.types.is_string_dtype(df[column]) and df[column].hasnans:
+            df[column] = df[column].astype(object).where(df[column].notna(), None)
+    return df
+
+@lru_cache(maxsize=512)
+def _to_pg_placeholders(query):
+    """Convert ? placeholders to %s, memoized since the same statements repeat"""
+    return query.replace('?', '%s')
+
 # Check if we should use PostgreSQL
 DATABASE_URL = os.getenv('DATABASE_URL')
 USE_POSTGRES = DATABASE_URL is not None
@@ -22,58 +70,368 @@ if USE_POSTGRES:
 else:
     print("📁 Using SQLite (local development)")
 
+# Hot-path SQL kept as module-level constants so the statement text is identical
+# across calls and sqlite3's per-connection statement cache can reuse the
+# compiled statement (? placeholders are converted for PostgreSQL in _execute)
+SQLITE_CACHED_STATEMENTS = 256
+# INSERT ... RETURNING is available from SQLite 3.35
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+# WAL lets readers run while a writer commits; the ~30s busy timeout absorbs
+# lock contention spikes instead of failing with "database is locked"; reads of
+# the (small) database file go through a 256 MB memory map instead of read() calls
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=30000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA mmap_size=268435456',
+)
+
+# Credential columns the chatbot may never read; SQLite returns NULL for them instead
+CHATBOT_HIDDEN_COLUMNS = {('users', 'password_hash'), ('users', 'invite_token')}
+CHATBOT_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+# Chatbot queries see these tables only through CTEs of the same name holding the caller's rows
+CHATBOT_USER_TABLES = ('income', 'allocations', 'expenses', 'savings', 'monthly_settlements', 'monthly_liquidity')
+CHATBOT_USER_COLUMNS = 'id, household_id, email, full_name, role, relationship, is_active, created_at'
+# Schema-qualified names would reach past those CTEs to the real tables
+CHATBOT_SCHEMAS = {'main', 'temp', 'public'}
+
+def _chatbot_authorizer(action, arg1, arg2, db_name, trigger):
+    """sqlite3 authorizer for chatbot queries: plain reads only, credential columns masked"""
+    if action == sqlite3.SQLITE_READ and (arg1, arg2) in CHATBOT_HIDDEN_COLUMNS:
+        return sqlite3.SQLITE_IGNORE
+    return sqlite3.SQLITE_OK if action in CHATBOT_ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+SQL_AUTHENTICATE_USER = 'SELECT id, household_id, email, full_name, role, relationship, is_active FROM users WHERE email = ? AND password_hash = ?'
+SQL_INSERT_INCOME = 'INSERT INTO income (user_id, date, source, amount) VALUES (?, ?, ?, ?)'
+# Applies a spent delta in place (SET expressions see the pre-update row), so there is no read-modify-write window
+SQL_UPDATE_ALLOC_SPENT = 'UPDATE allocations SET spent_amount = spent_amount + ?, balance = allocated_amount - (spent_amount + ?), updated_at = CURRENT_TIMESTAMP WHERE user_id = ? AND category = ? AND year = ? AND month = ?'
+SQL_INSERT_EXPENSE = 'INSERT INTO expenses (user_id, year, month, date, category, amount, comment, subcategory, payment_mode, payment_details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+SQL_SELECT_EXPENSE_FIELDS = 'SELECT date, category, amount, comment, subcategory, payment_mode, payment_details FROM expenses WHERE id = ? AND user_id = ?'
+SQL_SUM_EXPENSES = 'SELECT COALESCE(SUM(amount), 0) as total FROM expenses WHERE user_id = ?'
+SQL_INSERT_SAVING = 'INSERT INTO savings (user_id, date, category, amount, notes) VALUES (?, ?, ?, ?, ?)'
+# Column order of SQL_INSERT_EXPENSE / SQL_INSERT_SAVING, for _bulk_insert
+EXPENSE_COLUMNS = ('user_id', 'year', 'month', 'date', 'category', 'amount', 'comment', 'subcategory', 'payment_mode', 'payment_details')
+SAVING_COLUMNS = ('user_id', 'date', 'category', 'amount', 'notes')
+
+# Bump whenever a _migrate_* step is added so existing databases run the migrations again
+CURRENT_SCHEMA_VERSION = 7
+
+# Cached totals are keyed by the table's write version; the TTL bounds staleness
+# when another process (web app vs. mobile API) writes to the same database
+TOTALS_CACHE_TTL = 30
+TOTALS_CACHE_SIZE = 256
+LIQUIDITY_CACHE_SIZE = 64
+# Household admin lookups change only on promote/demote/delete
+ADMIN_CACHE_TTL = 60
+# Member lists are re-read on every Streamlit rerun of the admin dashboard
+MEMBERS_CACHE_TTL = 5
+# Super admin dashboard counts and listings; cleared on any household/user change made through this instance
+OVERVIEW_CACHE_TTL = 30
+
+# Reader queries keyed by method name; {ph} is replaced with the driver's
+# placeholder once per connection (MultiUserDB._sql) instead of on every call
+READER_SQL = {
+    'get_all_income': 'SELECT date as "Date", source as "Source", amount as "Amount" FROM income WHERE user_id = {ph} ORDER BY date DESC',
+    'get_income_with_ids': 'SELECT id, date, source, amount FROM income WHERE user_id = {ph} ORDER BY date DESC',
+    'get_income_with_ids_period': 'SELECT id, date, source, amount FROM income WHERE user_id = {ph} AND date >= {ph} AND date < {ph} ORDER BY date DESC',
+    'get_all_allocations': '''
+        SELECT 
+            id,
+            category as "Category", 
+            allocated_amount as "Allocated Amount", 
+            spent_amount as "Spent Amount", 
+            balance as "Balance" 
+        FROM allocations 
+        WHERE user_id = {ph}
+        ORDER BY category
+    ''',
+    'get_all_allocations_period': '''
+        SELECT 
+            id,
+            category as "Category", 
+            allocated_amount as "Allocated Amount", 
+            spent_amount as "Spent Amount", 
+            balance as "Balance" 
+        FROM allocations 
+        WHERE user_id = {ph} AND year = {ph} AND month = {ph}
+        ORDER BY category
+    ''',
+    'get_allocations_with_ids': 'SELECT id, category, year, month, allocated_amount, spent_amount, balance FROM allocations WHERE user_id = {ph} ORDER BY category',
+    'get_allocations_with_ids_period': 'SELECT id, category, year, month, allocated_amount, spent_amount, balance FROM allocations WHERE user_id = {ph} AND year = {ph} AND month = {ph} ORDER BY category',
+    'get_all_expenses': '''
+        SELECT 
+            id,
+            date as "Date", 
+            category as "Category",
+            subcategory as "Subcategory",
+            amount as "Amount", 
+            comment as "Comment",
+            payment_mode as "Payment_Mode",
+            payment_details as "Payment_Details"
+        FROM expenses 
+        WHERE user_id = {ph}
+        ORDER BY date DESC
+    ''',
+    'get_all_expenses_period': '''
+        SELECT 
+            id,
+            date as "Date", 
+            category as "Category",
+            subcategory as "Subcategory",
+            amount as "Amount", 
+            comment as "Comment",
+            payment_mode as "Payment_Mode",
+            payment_details as "Payment_Details"
+        FROM expenses 
+        WHERE user_id = {ph} AND date >= {ph} AND date < {ph}
+        ORDER BY date DESC
+    ''',
+    'get_expenses_by_category': '''
+        SELECT 
+            date as "Date", 
+            category as "Category", 
+            amount as "Amount", 
+            comment as "Comment" 
+        FROM expenses 
+        WHERE user_id = {ph} AND category = {ph}
+        ORDER BY date DESC
+    ''',
+    'get_expenses_with_ids': 'SELECT id, date, category, amount, subcategory, comment, payment_mode, payment_details FROM expenses WHERE user_id = {ph} ORDER BY date DESC',
+    'get_all_savings': 'SELECT date, category, amount, notes FROM savings WHERE user_id = {ph} ORDER BY date DESC',
+    'get_all_savings_period': 'SELECT date, category, amount, notes FROM savings WHERE user_id = {ph} AND date >= {ph} AND date < {ph} ORDER BY date DESC',
+    'get_savings_with_ids': 'SELECT id, date, category, amount, notes FROM savings WHERE user_id = {ph} ORDER BY date DESC',
+    'get_savings_with_ids_period': 'SELECT id, date, category, amount, notes FROM savings WHERE user_id = {ph} AND date >= {ph} AND date < {ph} ORDER BY date DESC',
+    'get_total_savings': 'SELECT COALESCE(SUM(amount), 0) as total FROM savings WHERE user_id = {ph}',
+    'get_total_savings_period': 'SELECT COALESCE(SUM(amount), 0) as total FROM savings WHERE user_id = {ph} AND date >= {ph} AND date < {ph}',
+}
+
+# Per-period budget reads run on every budget page rerun; on PostgreSQL they are
+# PREPAREd once per connection (statement name -> READER_SQL key, parameter types)
+PREPARED_READERS = {
+    'alloc_period': ('get_all_allocations_period', 'integer, integer, integer'),
+    'alloc_ids_period': ('get_allocations_with_ids_period', 'integer, integer, integer'),
+}
+
+# Row batch size for history readers that can grow with years of data
+READ_CHUNK_SIZE = 5000
+
+def _schema_sql(use_postgres):
+    """Build the CREATE TABLE script for one database type"""
+    # Column types differ between PostgreSQL and SQLite
+    id_type = "SERIAL PRIMARY KEY" if use_postgres else "INTEGER PRIMARY KEY AUTOINCREMENT"
+    bool_type = "BOOLEAN" if use_postgres else "INTEGER"
+    text_type = "TEXT"
+    
+    schema = []
+    
+    # Households table (with is_active for super admin management)
+    schema.append(f'''
+        CREATE TABLE IF NOT EXISTS households (
+            id {id_type},
+            name {text_type} NOT NULL,
+            created_by INTEGER,
+            is_active {bool_type} DEFAULT {'TRUE' if use_postgres else '1'},
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Users table (role can be: superadmin, admin, member)
+    schema.append(f'''
+        CREATE TABLE IF NOT EXISTS users (
+            id {id_type},
+            household_id INTEGER,
+            email {text_type} UNIQUE NOT NULL,
+            password_hash {'BYTEA' if use_postgres else 'BLOB'} NOT NULL,
+            full_name {text_type} NOT NULL,
+            role {text_type} DEFAULT 'member',
+            relationship {text_type},
+            is_active {bool_type} DEFAULT {'TRUE' if use_postgres else '1'},
+            invite_token {text_type} UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (household_id) REFERENCES households(id)
+        )
+    ''')
+    
+    # Income table (with user_id)
+    schema.append(f'''
+        CREATE TABLE IF NOT EXISTS income (
+            id {id_type},
+            user_id INTEGER NOT NULL,
+            date {text_type} NOT NULL,
+            source {text_type} NOT NULL,
+            amount {'NUMERIC' if use_postgres else 'REAL'} NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Allocations table (with user_id and period support)
+    schema.append(f'''
+        CREATE TABLE IF NOT EXISTS allocations (
+            id {id_type},
+            user_id INTEGER NOT NULL,
+            category {text_type} NOT NULL,
+            allocated_amount {'NUMERIC' if use_postgres else 'REAL'} NOT NULL,
+            spent_amount {'NUMERIC' if use_postgres else 'REAL'} DEFAULT 0,
+            balance {'NUMERIC' if use_postgres else 'REAL'} NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            UNIQUE(user_id, category)
+        )
+    ''')
+    
+    # Expenses table (with user_id)
+    schema.append(f'''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id {id_type},
+            user_id INTEGER NOT NULL,
+            date {text_type} NOT NULL,
+            category {text_type} NOT NULL,
+            amount {'NUMERIC' if use_postgres else 'REAL'} NOT NULL,
+            comment {text_type},
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Savings table (with user_id)
+    schema.append(f'''
+        CREATE TABLE IF NOT EXISTS savings (
+            id {id_type},
+            user_id INTEGER NOT NULL,
+            date {text_type} NOT NULL,
+            category {text_type} NOT NULL,
+            amount {'NUMERIC' if use_postgres else 'REAL'} NOT NULL,
+            notes {text_type},
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Monthly settlements table (with user_id)
+    schema.append(f'''
+        CREATE TABLE IF NOT EXISTS monthly_settlements (
+            id {id_type},
+            user_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            total_income {'NUMERIC' if use_postgres else 'REAL'} NOT NULL,
+            total_expenses {'NUMERIC' if use_postgres else 'REAL'} NOT NULL,
+            total_savings {'NUMERIC' if use_postgres else 'REAL'} NOT NULL,
+            settled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            UNIQUE(user_id, year, month)
+        )
+    ''')
+    
+    # Schema version recorded once every migration below has succeeded
+    schema.append('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY)')
+    
+    if use_postgres:
+        # Ensure is_active column exists (Postgres 9.6+ supports IF NOT EXISTS)
+        schema.append('ALTER TABLE households ADD COLUMN IF NOT EXISTS is_active BOOLEAN DEFAULT TRUE')
+    return ';'.join(schema)
+
+# The DDL depends only on the database type, so both scripts are built once at import
+_SCHEMA_POSTGRES = _schema_sql(True)
+_SCHEMA_SQLITE = _schema_sql(False)
+
 class MultiUserDB:
     """Manages multi-user database operations with role-based access control"""
     
     def __init__(self, db_path=None):
         """Initialize database connection"""
         self.use_postgres = USE_POSTGRES
+        self._ph = '%s' if self.use_postgres else '?'
+        # Boolean column values: native booleans on PostgreSQL, 0/1 integers on SQLite
+        self._true, self._false = (True, False) if self.use_postgres else (1, 0)
+        self._sql = {name: query.format(ph=self._ph) for name, query in READER_SQL.items()}
         
         if USE_POSTGRES:
             # psycopg2 for regular queries
-            self.conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-            self.conn.autocommit = False
+            self._connect_postgres()
             print("✅ Connected to PostgreSQL")
-            
-            # SQLAlchemy engine for pandas queries (fixes connection issues)
-            self.engine = create_engine(
-                DATABASE_URL,
-                poolclass=NullPool,  # No pooling for serverless
-                connect_args={"sslmode": "require"}
-            )
-            print("✅ SQLAlchemy engine created for pandas queries")
             self.db_path = None
         else:
             if db_path is None:
                 db_path = "/data/family_budget.db" if os.path.exists("/data") else os.path.join(os.path.dirname(__file__), "family_budget.db")
             self.db_path = db_path
-            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=SQLITE_CACHED_STATEMENTS)
             self.conn.row_factory = sqlite3.Row
-            self.engine = None  # No engine needed for SQLite
+            self._configure_sqlite()
             print("✅ Connected to SQLite")
         
+        self._engine = None  # SQLAlchemy engine, created by the engine property on first pandas query
+        
+        self._returning = self.use_postgres or SQLITE_HAS_RETURNING
+        
+        # Per-table write versions used to invalidate cached totals
+        self._ver = {'expenses': 0, 'savings': 0, 'income': 0, 'allocations': 0}
+        self._totals_cache = {}
+        self._liq_cache = OrderedDict()  # LRU of liquidity DataFrames
+        self._admin_cache = {}  # household_id -> (fetched_at, admin dict or None)
+        self._members_cache = {}  # household_id -> (fetched_at, members DataFrame)
+        self._overview_cache = {}  # super admin method name -> (fetched_at, result)
+        self._prepared_conn = None  # connection the server-side statements were PREPAREd on
+        self._prepared = set()  # names PREPAREd on _prepared_conn
+        self._chatbot_conn = None  # separate read-only connection for chatbot queries
+        self._chatbot_tables = ()  # CHATBOT_USER_TABLES present in this database
+        
         self._initialize_tables()
     
+    @property
+    def engine(self):
+        """SQLAlchemy engine for pandas queries on PostgreSQL (None on SQLite), created on first use"""
+        if self._engine is None and self.use_postgres:
+            if os.getenv('DB_USE_NULLPOOL') == '1':
+                # Serverless deployments that must cap total connections
+                pool_options = {'poolclass': NullPool}
+            else:
+                # Long-running app: reuse connections instead of reconnecting per query
+                pool_options = {
+                    'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+                    'max_overflow': int(os.getenv('DB_POOL_OVERFLOW', '5')),
+                    'pool_pre_ping': True,
+                    'pool_recycle': 1800,
+                }
+            self._engine = create_engine(
+                DATABASE_URL,
+                connect_args={"sslmode": "require"},
+                **pool_options
+            )
+            logger.info("SQLAlchemy engine created for pandas queries")
+        return self._engine
+    
+    def _connect_postgres(self):
+        """Open the psycopg2 connection, with TCP keepalives so dropped connections are detected"""
+        self.conn = self._open_postgres()
+        self.conn.autocommit = False
+    
+    def _open_postgres(self):
+        """Open a new psycopg2 connection with dict rows and TCP keepalives"""
+        return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor,
+                                keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+    
     def _ensure_connection(self):
-        """Ensure database connection is alive, reconnect if needed"""
-        if self.use_postgres:
-            try:
-                cursor = self.conn.cursor()
-                cursor.execute('SELECT 1')
-                cursor.close()
-            except:
-                print("Connection lost, reconnecting...")
-                import psycopg2
-                from psycopg2.extras import RealDictCursor
-                self.conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-                self.conn.autocommit = False
-                print("✅ Reconnected to PostgreSQL")
+        """Reconnect if the connection is already known to be closed"""
+        # conn.closed is client-side state, so this costs no round-trip; connections that
+        # died silently are caught by keepalives and the reconnect in _execute
+        if self.use_postgres and self.conn.closed:
+            logger.warning("Connection lost, reconnecting...")
+            self._connect_postgres()
+            logger.info("Reconnected to PostgreSQL")
     
     def _execute(self, cursor, query, params=None):
         """Helper method to execute queries with correct parameter syntax for the database type"""
         if self.use_postgres:
             # Convert ? placeholders to %s for PostgreSQL
-            query = query.replace('?', '%s')
+            query = _to_pg_placeholders(query)
         
         # Try to execute with connection recovery
         try:
@@ -85,179 +443,485 @@ class MultiUserDB:
             error_msg = str(e)
             # Check if it's a connection error
             if 'closed' in error_msg.lower() or ('connection' in error_msg.lower() and 'unexpectedly' in error_msg.lower()):
-                print(f"⚠️ Connection error detected: {error_msg[:100]}")
-                print("🔄 Attempting to reconnect...")
+                logger.warning("Connection error detected: %.100s", error_msg)
+                logger.info("Attempting to reconnect...")
                 try:
                     # Reconnect based on database type
                     if self.use_postgres:
-                        import psycopg2
-                        from psycopg2.extras import RealDictCursor
-                        self.conn = psycopg2.connect(self.db_path if self.db_path else DATABASE_URL, cursor_factory=RealDictCursor)
-                        self.conn.autocommit = False
-                        print("✅ Reconnected to PostgreSQL")
+                        self._connect_postgres()
+                        logger.info("Reconnected to PostgreSQL")
                     else:
                         import sqlite3
-                        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=SQLITE_CACHED_STATEMENTS)
                         self.conn.row_factory = sqlite3.Row
-                        print("✅ Reconnected to SQLite")
+                        self._configure_sqlite()
+                        logger.info("Reconnected to SQLite")
                     
                     # Get new cursor and retry query
                     cursor = self.conn.cursor()
+                    if query.startswith('EXECUTE '):
+                        # Prepared statements died with the old session
+                        self._prepare_statement(cursor, query[len('EXECUTE '):query.index('(')])
                     if params:
                         cursor.execute(query, params)
                     else:
                         cursor.execute(query)
-                    print("✅ Query executed successfully after reconnection")
+                    logger.info("Query executed successfully after reconnection")
                 except Exception as reconnect_error:
-                    print(f"❌ Reconnection failed: {reconnect_error}")
+                    logger.error("Reconnection failed: %s", reconnect_error)
                     raise
             else:
                 # Not a connection error, re-raise original
                 raise
         
         return cursor
+    
+    @contextmanager
+    def _tx(self, immediate=False):
+        """Yield (cursor, commit) for one unit of work, rolling back if it raises or returns without committing
         
-    def _initialize_tables(self):
-        """Create tables if they don't exist"""
+        immediate takes SQLite's write lock up front, for units that read before they write:
+        a deferred transaction that later upgrades to a writer can fail with "database is locked"
+        when another connection committed in between, which busy_timeout cannot wait out.
+        """
         cursor = self.conn.cursor()
+        if immediate and not self.use_postgres and not self.conn.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        committed = False
         
-        # Detect if using PostgreSQL or SQLite
-        id_type = "SERIAL PRIMARY KEY" if self.use_postgres else "INTEGER PRIMARY KEY AUTOINCREMENT"
-        bool_type = "BOOLEAN" if self.use_postgres else "INTEGER"
-        text_type = "TEXT"
+        def commit():
+            nonlocal committed
+            self.conn.commit()
+            committed = True
         
-        # Households table (with is_active for super admin management)
-        cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS households (
-                id {id_type},
-                name {text_type} NOT NULL,
-                created_by INTEGER,
-                is_active {bool_type} DEFAULT {'TRUE' if self.use_postgres else '1'},
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        try:
+            yield cursor, commit
+        except Exception:
+            self.conn.rollback()
+            raise
+        else:
+            # Early "not found" returns would otherwise leave the write transaction (and SQLite's lock) open
+            if not committed:
+                self.conn.rollback()
+        finally:
+            cursor.close()
+    
+    def _configure_sqlite(self):
+        """Apply the foreign key and WAL/synchronous PRAGMAs to a fresh SQLite connection"""
+        # SQLite only enforces foreign keys (and their ON DELETE CASCADE) when asked to, per connection
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        # In-memory databases cannot use WAL and have nothing to fsync
+        if self.db_path == ':memory:':
+            return
+        with closing(self.conn.cursor()) as cursor:
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+    
+    def _prepared_definition(self, name):
+        """Return the 'name(arg types) AS query' text to PREPARE for a hot PostgreSQL statement"""
+        if name == 'auth_user':
+            return 'auth_user(text, bytea) AS ' + SQL_AUTHENTICATE_USER.replace('?', '$1', 1).replace('?', '$2', 1)
+        if name in ('liq_household', 'liq_member'):
+            return f'{name}(integer, integer) AS ' + self._liquidity_sql(name == 'liq_household', '$1', '$2')
+        reader, arg_types = PREPARED_READERS[name]
+        position = iter(range(1, 10))
+        body = re.sub(r'\{ph\}', lambda _: f'${next(position)}', READER_SQL[reader])
+        return f'{name}({arg_types}) AS {body}'
+    
+    def _prepare_statement(self, cursor, name):
+        """PREPARE one hot PostgreSQL statement, once per connection
         
-        # Users table (role can be: superadmin, admin, member)
-        cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS users (
-                id {id_type},
-                household_id INTEGER,
-                email {text_type} UNIQUE NOT NULL,
-                password_hash {text_type} NOT NULL,
-                full_name {text_type} NOT NULL,
-                role {text_type} DEFAULT 'member',
-                relationship {text_type},
-                is_active {bool_type} DEFAULT {'TRUE' if self.use_postgres else '1'},
-                invite_token {text_type} UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (household_id) REFERENCES households(id)
-            )
-        ''')
+        Each statement is prepared on first use, so one that fails to prepare
+        (e.g. liquidity before its migration ran) doesn't take the others down with it.
+        """
+        # Prepared statements live per session, so start over after a reconnect
+        if self._prepared_conn is not self.conn:
+            self._prepared_conn, self._prepared = self.conn, set()
+        if name in self._prepared:
+            return
         
-        # Check and add is_active column to households if it doesn't exist
-        if not self.use_postgres:
-            cursor.execute("PRAGMA table_info(households)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'is_active' not in columns:
-                cursor.execute('ALTER TABLE households ADD COLUMN is_active INTEGER DEFAULT 1')
-                print("✅ Added is_active column to households table (SQLite)")
-        else:
-            # Postgres: Ensure is_active column exists
-            try:
-                # Postgres 9.6+ supports IF NOT EXISTS
-                cursor.execute("ALTER TABLE households ADD COLUMN IF NOT EXISTS is_active BOOLEAN DEFAULT TRUE")
-            except Exception as e:
-                print(f"⚠️ Postgres is_active column check: {str(e)}")
+        try:
+            self._execute(cursor, 'PREPARE ' + self._prepared_definition(name))
+        except Exception as e:
+            # A failed statement aborts the PostgreSQL transaction; clear it so the connection stays usable
+            self.conn.rollback()
+            # PREPARE isn't undone by a rollback, so a statement left over from an earlier attempt is still usable
+            if 'already exists' not in str(e):
+                raise
         
-        # Income table (with user_id)
-        cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS income (
-                id {id_type},
-                user_id INTEGER NOT NULL,
-                date {text_type} NOT NULL,
-                source {text_type} NOT NULL,
-                amount {'NUMERIC' if self.use_postgres else 'REAL'} NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+        if self._prepared_conn is not self.conn:
+            # _execute reconnected and retried the PREPARE on the new session
+            self._prepared_conn, self._prepared = self.conn, set()
+        self._prepared.add(name)
+    
+    def _pg_columns_exist(self, cursor, table, *columns):
+        """Return whether each column exists on a PostgreSQL table, as one row of EXISTS booleans"""
+        probes = ', '.join(
+            f'EXISTS(SELECT 1 FROM information_schema.columns WHERE table_name = ? AND column_name = ?) AS c{i}'
+            for i in range(len(columns)))
+        self._execute(cursor, f'SELECT {probes}', [arg for column in columns for arg in (table, column)])
+        return tuple(cursor.fetchone().values())
+    
+    def _row_dict(self, row):
+        """Return a fetched row as a dict, copying only when the driver didn't already build one"""
+        # RealDictCursor rows are dicts already; sqlite3.Row supports ['col'] but not .get()
+        return row if self.use_postgres else dict(row)
+    
+    def _insert_returning_id(self, cursor, query, params):
+        """Run an INSERT and return the new row id in the same round-trip"""
+        if not self._returning:
+            self._execute(cursor, query, params)
+            return cursor.lastrowid
+        self._execute(cursor, query + ' RETURNING id', params)
+        return cursor.fetchone()['id']
+    
+    def _bump_version(self, *tables):
+        """Mark tables as written so cached totals computed from them are discarded"""
+        for table in tables:
+            self._ver[table] += 1
+    
+    def invalidate_caches(self):
+        """Discard every cached read, for callers that write through the connection directly"""
+        self._bump_version('expenses', 'allocations', 'income', 'savings')
+        self._admin_cache.clear()
+        self._members_cache.clear()
+        self._overview_cache.clear()
+    
+    def _cached_total(self, table, key, compute):
+        """Return compute() cached per (table, key) until the table is written or the TTL expires"""
+        cache_key = (table, key, self._ver[table])
+        cached = self._totals_cache.get(cache_key)
+        if cached and time.time() - cached[0] < TOTALS_CACHE_TTL:
+            return cached[1]
         
-        # Allocations table (with user_id and period support)
-        cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS allocations (
-                id {id_type},
-                user_id INTEGER NOT NULL,
-                category {text_type} NOT NULL,
-                allocated_amount {'NUMERIC' if self.use_postgres else 'REAL'} NOT NULL,
-                spent_amount {'NUMERIC' if self.use_postgres else 'REAL'} DEFAULT 0,
-                balance {'NUMERIC' if self.use_postgres else 'REAL'} NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                UNIQUE(user_id, category)
-            )
-        ''')
+        value = compute()
+        if len(self._totals_cache) >= TOTALS_CACHE_SIZE:
+            self._totals_cache.clear()
+        self._totals_cache[cache_key] = (time.time(), value)
+        return value
+    
+    def _cached_liquidity(self, key, compute):
+        """Return a copy of compute()'s DataFrame, cached until income or allocations are written"""
+        cache_key = key + (self._ver['income'], self._ver['allocations'])
+        cached = self._liq_cache.get(cache_key)
+        if cached and time.time() - cached[0] < TOTALS_CACHE_TTL:
+            self._liq_cache.move_to_end(cache_key)
+            return cached[1].copy()
         
-        # Expenses table (with user_id)
-        cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS expenses (
-                id {id_type},
-                user_id INTEGER NOT NULL,
-                date {text_type} NOT NULL,
-                category {text_type} NOT NULL,
-                amount {'NUMERIC' if self.use_postgres else 'REAL'} NOT NULL,
-                comment {text_type},
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+        df = compute()
+        # Empty frames are also what the error path returns, so only cache real results
+        if not df.empty:
+            self._liq_cache[cache_key] = (time.time(), df)
+            if len(self._liq_cache) > LIQUIDITY_CACHE_SIZE:
+                self._liq_cache.popitem(last=False)
+        return df.copy()
+    
+    def _fetch_total(self, query, params):
+        """Run a single-value SUM query and return the total"""
+        with closing(self.conn.cursor()) as cursor:
+            self._execute(cursor, query, params)
+            return cursor.fetchone()['total']
+    
+    def _read_sql_chunked(self, query, conn_to_use, params):
+        """Read a query into an Arrow-backed DataFrame in batches so intermediate rows can be freed early"""
+        if conn_to_use is self.engine:
+            # stream_results makes psycopg2 use a server-side (named) cursor, so only
+            # one batch of rows is buffered client-side instead of the whole result
+            with self.engine.connect().execution_options(stream_results=True, max_row_buffer=READ_CHUNK_SIZE) as conn:
+                chunks = pd.read_sql_query(query, conn, params=params, chunksize=READ_CHUNK_SIZE,
+                                           dtype_backend='pyarrow')
+                return _text_nulls_as_none(pd.concat(chunks, ignore_index=True))
+        chunks = pd.read_sql_query(query, conn_to_use, params=params, chunksize=READ_CHUNK_SIZE,
+                                   dtype_backend='pyarrow')
+        return _text_nulls_as_none(pd.concat(chunks, ignore_index=True))
+    
+    def _fetch_frame(self, query, params=(), prepared=None, stream=False):
+        """Build a small DataFrame straight from a DB-API cursor, skipping read_sql's per-call overhead
         
-        # Savings table (with user_id)
-        cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS savings (
-                id {id_type},
-                user_id INTEGER NOT NULL,
-                date {text_type} NOT NULL,
-                category {text_type} NOT NULL,
-                amount {'NUMERIC' if self.use_postgres else 'REAL'} NOT NULL,
-                notes {text_type},
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+        prepared names a PREPARED_READERS statement to EXECUTE instead of query on PostgreSQL.
+        stream fetches READ_CHUNK_SIZE rows at a time (through a server-side cursor on PostgreSQL)
+        so only one batch of row objects is alive while the frame is built.
+        """
+        # psycopg2 only leaves rows on the server for named cursors
+        named = stream and self.use_postgres
+        with closing(self.conn.cursor(name='fetch_frame') if named else self.conn.cursor()) as cursor:
+            if prepared and self.use_postgres:
+                # Named cursors can only run their one query, so PREPARE on a plain one
+                with closing(self.conn.cursor()) as prepare_cursor:
+                    self._prepare_statement(prepare_cursor, prepared)
+                query = f"EXECUTE {prepared}({', '.join('?' * len(params))})"
+            self._execute(cursor, query, params)
+            if not stream:
+                return pd.DataFrame.from_records(cursor.fetchall(), columns=[col[0] for col in cursor.description],
+                                                 coerce_float=True)
+            
+            # A named cursor only has a description once the first batch is fetched
+            rows = cursor.fetchmany(READ_CHUNK_SIZE)
+            columns = [col[0] for col in cursor.description]
+            frames = [pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)]
+            while len(rows) == READ_CHUNK_SIZE:
+                rows = cursor.fetchmany(READ_CHUNK_SIZE)
+                frames.append(pd.DataFrame.from_records(rows, columns=columns, coerce_float=True))
+            return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    
+    def _fetch_rows(self, query, params=()):
+        """Run a query and return its rows as a list of dicts, for callers that serialize rather than analyze"""
+        with closing(self.conn.cursor()) as cursor:
+            self._execute(cursor, query, params)
+            return [self._row_dict(row) for row in cursor.fetchall()]
+    
+    def _bulk_insert(self, cursor, table, columns, rows, return_ids=False, returning=None):
+        """Insert many rows in one call (execute_values on PostgreSQL, executemany on SQLite)
         
-        # Monthly settlements table (with user_id)
-        cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS monthly_settlements (
-                id {id_type},
-                user_id INTEGER NOT NULL,
-                year INTEGER NOT NULL,
-                month INTEGER NOT NULL,
-                total_income {'NUMERIC' if self.use_postgres else 'REAL'} NOT NULL,
-                total_expenses {'NUMERIC' if self.use_postgres else 'REAL'} NOT NULL,
-                total_savings {'NUMERIC' if self.use_postgres else 'REAL'} NOT NULL,
-                settled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                UNIQUE(user_id, year, month)
-            )
-        ''')
+        returning names columns to hand back as one dict per inserted row, for callers that
+        need to match rows up: PostgreSQL doesn't promise RETURNING follows VALUES order.
+        """
+        column_list = ', '.join(columns)
+        if self.use_postgres:
+            query = f'INSERT INTO {table} ({column_list}) VALUES %s'
+            if returning:
+                return execute_values(cursor, query + ' RETURNING ' + ', '.join(returning), rows,
+                                      page_size=1000, fetch=True)
+            if not return_ids:
+                execute_values(cursor, query, rows, page_size=1000)
+                return None
+            return [row['id'] for row in execute_values(cursor, query + ' RETURNING id', rows, page_size=1000, fetch=True)]
+        
+        placeholders = ', '.join('?' * len(columns))
+        query = f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})'
+        if returning:
+            # One statement per row here, so the row and its id are known to belong together
+            inserted = []
+            for row in rows:
+                values = dict(zip(columns, row), id=self._insert_returning_id(cursor, query, row))
+                inserted.append({column: values[column] for column in returning})
+            return inserted
+        if not return_ids:
+            cursor.executemany(query, rows)
+            return None
+        # executemany can't report ids, and row-by-row calls are in-process on SQLite
+        return [self._insert_returning_id(cursor, query, row) for row in rows]
+    
+    def _initialize_tables(self):
+        """Create tables if they don't exist"""
+        cursor = self.conn.cursor()
+        
+        # All CREATE TABLEs go to the server as one script instead of a round-trip each
+        if self.use_postgres:
+            cursor.execute(_SCHEMA_POSTGRES)
+        else:
+            self.conn.executescript(_SCHEMA_SQLITE)
+            
+            # Check and add is_active column to households if it doesn't exist
+            cursor.execute("PRAGMA table_info(households)")
+            columns = [column[1] for column in cursor.fetchall()]
+            if 'is_active' not in columns:
+                cursor.execute('ALTER TABLE households ADD COLUMN is_active INTEGER DEFAULT 1')
+                print("✅ Added is_active column to households table (SQLite)")
         
         self.conn.commit()
         
-        # Run migrations to add period columns
-        self._migrate_add_period_columns()
+        self._execute(cursor, 'SELECT MAX(version) as version FROM schema_version')
+        if (cursor.fetchone()['version'] or 0) < CURRENT_SCHEMA_VERSION:
+            # Run migrations to add period columns
+            migrated = self._migrate_add_period_columns()
+            
+            # Run migration to add subcategory column
+            migrated &= self._migrate_add_subcategory_column()
+            
+            # Run migration to add payment columns
+            migrated &= self._migrate_add_payment_columns()
+            
+            # Run migration to add generated year/month columns to income
+            migrated &= self._migrate_add_income_period_columns()
+            
+            # Run migration to pin monetary columns to NUMERIC(14,2) on PostgreSQL
+            migrated &= self._migrate_monetary_columns()
+            
+            # Run migration to cascade user deletes to per-user tables
+            migrated &= self._migrate_cascade_foreign_keys()
+            
+            # Run migration to store password hashes as raw digests
+            migrated &= self._migrate_password_hash_bytes()
+            
+            if migrated:
+                self._execute(cursor, 'INSERT INTO schema_version (version) VALUES (?)', (CURRENT_SCHEMA_VERSION,))
+                self.conn.commit()
+        
+        # Create indexes after migrations (SQLite migrations rebuild tables, dropping their indexes)
+        self._create_indexes()
         
-        # Run migration to add subcategory column
-        self._migrate_add_subcategory_column()
+        # Summary table needs the income year/month columns from the migrations above
+        self._create_liquidity_summary()
         
-        # Run migration to add payment columns
-        self._migrate_add_payment_columns()
+        # Expense triggers need the expenses year/month columns from the migrations above
+        self._create_spent_triggers()
         
         # Create super admin if it doesn't exist
         self._create_super_admin()
     
+    def _create_liquidity_summary(self):
+        """Create the trigger-maintained monthly_liquidity summary read by the liquidity dashboard"""
+        try:
+            cursor = self.conn.cursor()
+            money_type = 'NUMERIC(14,2)' if self.use_postgres else 'REAL'
+            
+            if self.use_postgres:
+                self._execute(cursor, "SELECT to_regclass('monthly_liquidity') IS NOT NULL as present")
+                exists = cursor.fetchone()['present']
+            else:
+                cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'monthly_liquidity'")
+                exists = cursor.fetchone()[0] > 0
+            
+            # Row counters keep a (user, month) visible while it still has income or allocation rows
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS monthly_liquidity (
+                    user_id INTEGER NOT NULL,
+                    year INTEGER NOT NULL,
+                    month INTEGER NOT NULL,
+                    income {money_type} NOT NULL DEFAULT 0,
+                    allocated {money_type} NOT NULL DEFAULT 0,
+                    income_rows INTEGER NOT NULL DEFAULT 0,
+                    alloc_rows INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, year, month),
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            ''')
+            
+            # Updates of other columns (e.g. allocations.spent_amount on every expense write) leave the summary alone;
+            # income's year/month are generated from date, so date is what an update actually names
+            for source, amount, total, rows, tracked_columns in (
+                    ('income', 'amount', 'income', 'income_rows', 'user_id, date, year, month, amount'),
+                    ('allocations', 'allocated_amount', 'allocated', 'alloc_rows', 'user_id, year, month, allocated_amount')):
+                remove_old = f'''
+                    UPDATE monthly_liquidity SET {total} = {total} - OLD.{amount}, {rows} = {rows} - 1
+                    WHERE user_id = OLD.user_id AND year = OLD.year AND month = OLD.month;
+                '''
+                add_new = f'''
+                    INSERT INTO monthly_liquidity (user_id, year, month, {total}, {rows})
+                    VALUES (NEW.user_id, NEW.year, NEW.month, NEW.{amount}, 1)
+                    ON CONFLICT (user_id, year, month) DO UPDATE
+                    SET {total} = monthly_liquidity.{total} + excluded.{total}, {rows} = monthly_liquidity.{rows} + 1;
+                '''
+                if self.use_postgres:
+                    # Triggers from before the column list was added fire on every UPDATE; replace those
+                    self._execute(cursor, 'SELECT pg_get_triggerdef(oid) as definition FROM pg_trigger WHERE tgname = ?',
+                                  (f'liq_{source}_sync',))
+                    current = cursor.fetchone()
+                    if exists and current and 'UPDATE OF' in current['definition']:
+                        continue
+                    cursor.execute(f'''
+                        CREATE OR REPLACE FUNCTION liq_{source}_sync() RETURNS trigger AS $$
+                        BEGIN
+                            IF TG_OP IN ('UPDATE', 'DELETE') THEN {remove_old} END IF;
+                            IF TG_OP IN ('INSERT', 'UPDATE') THEN {add_new} END IF;
+                            RETURN NULL;
+                        END
+                        $$ LANGUAGE plpgsql
+                    ''')
+                    cursor.execute(f'DROP TRIGGER IF EXISTS liq_{source}_sync ON {source}')
+                    cursor.execute(f'CREATE TRIGGER liq_{source}_sync AFTER INSERT OR DELETE OR UPDATE OF {tracked_columns} '
+                                   f'ON {source} FOR EACH ROW EXECUTE FUNCTION liq_{source}_sync()')
+                else:
+                    # Table-rebuilding SQLite migrations drop triggers, so (re)create them every start
+                    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS liq_{source}_ins AFTER INSERT ON {source} BEGIN {add_new} END')
+                    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS liq_{source}_del AFTER DELETE ON {source} BEGIN {remove_old} END')
+                    # Replace an update trigger created with an older column list
+                    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (f'liq_{source}_upd',))
+                    current = cursor.fetchone()
+                    if current and f'UPDATE OF {tracked_columns} ON' not in current[0]:
+                        cursor.execute(f'DROP TRIGGER liq_{source}_upd')
+                    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS liq_{source}_upd AFTER UPDATE OF {tracked_columns} ON {source} '
+                                   f'BEGIN {remove_old} {add_new} END')
+            
+            if not exists:
+                print("🔄 Building monthly_liquidity summary...")
+                cursor.execute('''
+                    INSERT INTO monthly_liquidity (user_id, year, month, income, income_rows)
+                    SELECT user_id, year, month, SUM(amount), COUNT(*) FROM income GROUP BY user_id, year, month
+                ''')
+                cursor.execute('''
+                    INSERT INTO monthly_liquidity (user_id, year, month, allocated, alloc_rows)
+                    SELECT user_id, year, month, SUM(allocated_amount), COUNT(*) FROM allocations GROUP BY user_id, year, month
+                    ON CONFLICT (user_id, year, month) DO UPDATE
+                    SET allocated = excluded.allocated, alloc_rows = excluded.alloc_rows
+                ''')
+            
+            self.conn.commit()
+        except Exception as e:
+            logger.warning("Liquidity summary creation error: %s", e)
+            self.conn.rollback()
+    
+    def _create_spent_triggers(self):
+        """Create the triggers that keep allocations.spent_amount/balance in step with expense writes"""
+        try:
+            cursor = self.conn.cursor()
+            
+            remove_old = '''
+                UPDATE allocations SET spent_amount = spent_amount - OLD.amount,
+                    balance = allocated_amount - (spent_amount - OLD.amount), updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = OLD.user_id AND category = OLD.category AND year = OLD.year AND month = OLD.month;
+            '''
+            add_new = '''
+                UPDATE allocations SET spent_amount = spent_amount + NEW.amount,
+                    balance = allocated_amount - (spent_amount + NEW.amount), updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = NEW.user_id AND category = NEW.category AND year = NEW.year AND month = NEW.month;
+            '''
+            tracked_columns = 'user_id, category, year, month, amount'
+            if self.use_postgres:
+                cursor.execute("SELECT EXISTS(SELECT 1 FROM pg_trigger WHERE tgname = 'alloc_spent_sync') as present")
+                if not cursor.fetchone()['present']:
+                    cursor.execute(f'''
+                        CREATE OR REPLACE FUNCTION alloc_spent_sync() RETURNS trigger AS $$
+                        BEGIN
+                            IF TG_OP IN ('UPDATE', 'DELETE') THEN {remove_old} END IF;
+                            IF TG_OP IN ('INSERT', 'UPDATE') THEN {add_new} END IF;
+                            RETURN NULL;
+                        END
+                        $$ LANGUAGE plpgsql
+                    ''')
+                    cursor.execute(f'CREATE TRIGGER alloc_spent_sync AFTER INSERT OR DELETE OR UPDATE OF {tracked_columns} '
+                                   f'ON expenses FOR EACH ROW EXECUTE FUNCTION alloc_spent_sync()')
+            else:
+                # Table-rebuilding SQLite migrations drop triggers, so (re)create them every start
+                cursor.execute(f'CREATE TRIGGER IF NOT EXISTS alloc_spent_ins AFTER INSERT ON expenses BEGIN {add_new} END')
+                cursor.execute(f'CREATE TRIGGER IF NOT EXISTS alloc_spent_del AFTER DELETE ON expenses BEGIN {remove_old} END')
+                cursor.execute(f'CREATE TRIGGER IF NOT EXISTS alloc_spent_upd AFTER UPDATE OF {tracked_columns} ON expenses '
+                               f'BEGIN {remove_old} {add_new} END')
+            
+            self.conn.commit()
+        except Exception as e:
+            logger.warning("Allocation spent trigger creation error: %s", e)
+            self.conn.rollback()
+    
+    def _create_indexes(self):
+        """Create composite indexes for the user-scoped WHERE clauses"""
+        try:
+            cursor = self.conn.cursor()
+            
+            # allocations(user_id, category, year, month) is already covered by its UNIQUE constraint;
+            # period lookups without a category need (user_id, year, month) as the leading columns
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_alloc_uym ON allocations(user_id, year, month)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_exp_ucd ON expenses(user_id, category, date)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_exp_ud ON expenses(user_id, date)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_inc_ud ON income(user_id, date)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_inc_uym ON income(user_id, year, month)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_savings_ud ON savings(user_id, date)')
+            # Member lists and household-wide reports filter users by household, and admin counts
+            # add role/is_active, so one (household_id, role, is_active) index serves both; email and
+            # invite_token lookups already use the indexes behind their UNIQUE constraints
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_household_role ON users(household_id, role, is_active)')
+            cursor.execute('DROP INDEX IF EXISTS idx_users_household')
+            
+            if not self.use_postgres:
+                # Refresh planner statistics only when SQLite decides they are stale
+                cursor.execute('PRAGMA optimize')
+            
+            self.conn.commit()
+        except Exception as e:
+            logger.warning("Index creation error: %s", e)
+            self.conn.rollback()
+    
     def _migrate_add_period_columns(self):
         """Migrate existing tables to add year/month columns for period-based budgeting"""
         try:
@@ -269,26 +933,22 @@ class MultiUserDB:
             # Check and add columns to allocations table
             if self.use_postgres:
                 # PostgreSQL: Check if columns exist
-                self._execute(cursor, """
-                    SELECT column_name FROM information_schema.columns 
-                    WHERE table_name = 'allocations' AND column_name IN ('year', 'month')
-                """)
-                existing_cols = [row['column_name'] for row in cursor.fetchall()]
+                has_year, has_month = self._pg_columns_exist(cursor, 'allocations', 'year', 'month')
                 
-                if 'year' not in existing_cols:
+                if not has_year:
                     print("🔄 Adding year column to allocations table...")
                     self._execute(cursor, f'ALTER TABLE allocations ADD COLUMN year INTEGER DEFAULT {current_year}')
                     self._execute(cursor, f'UPDATE allocations SET year = {current_year} WHERE year IS NULL')
                     self._execute(cursor, 'ALTER TABLE allocations ALTER COLUMN year SET NOT NULL')
                 
-                if 'month' not in existing_cols:
+                if not has_month:
                     print("🔄 Adding month column to allocations table...")
                     self._execute(cursor, f'ALTER TABLE allocations ADD COLUMN month INTEGER DEFAULT {current_month}')
                     self._execute(cursor, f'UPDATE allocations SET month = {current_month} WHERE month IS NULL')
                     self._execute(cursor, 'ALTER TABLE allocations ALTER COLUMN month SET NOT NULL')
                 
                 # Update constraint if columns were added
-                if 'year' not in existing_cols or 'month' not in existing_cols:
+                if not has_year or not has_month:
                     print("🔄 Updating allocations UNIQUE constraint for period-based budgeting...")
                     # Drop old constraint and create new one
                     try:
@@ -317,7 +977,7 @@ class MultiUserDB:
                             balance REAL NOT NULL,
                             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            FOREIGN KEY (user_id) REFERENCES users(id),
+                            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
                             UNIQUE(user_id, category, year, month)
                         )
                     ''')
@@ -336,19 +996,15 @@ class MultiUserDB:
             
             # Check and add columns to expenses table
             if self.use_postgres:
-                self._execute(cursor, """
-                    SELECT column_name FROM information_schema.columns 
-                    WHERE table_name = 'expenses' AND column_name IN ('year', 'month')
-                """)
-                existing_cols = [row['column_name'] for row in cursor.fetchall()]
+                has_year, has_month = self._pg_columns_exist(cursor, 'expenses', 'year', 'month')
                 
-                if 'year' not in existing_cols:
+                if not has_year:
                     print("🔄 Adding year column to expenses table...")
                     self._execute(cursor, f'ALTER TABLE expenses ADD COLUMN year INTEGER DEFAULT {current_year}')
                     self._execute(cursor, f'UPDATE expenses SET year = {current_year} WHERE year IS NULL')
                     self._execute(cursor, 'ALTER TABLE expenses ALTER COLUMN year SET NOT NULL')
                 
-                if 'month' not in existing_cols:
+                if not has_month:
                     print("🔄 Adding month column to expenses table...")
                     self._execute(cursor, f'ALTER TABLE expenses ADD COLUMN month INTEGER DEFAULT {current_month}')
                     self._execute(cursor, f'UPDATE expenses SET month = {current_month} WHERE month IS NULL')
@@ -372,7 +1028,7 @@ class MultiUserDB:
                             comment TEXT,
                             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            FOREIGN KEY (user_id) REFERENCES users(id)
+                            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
                         )
                     ''')
                     
@@ -390,10 +1046,12 @@ class MultiUserDB:
             
             self.conn.commit()
             print("✅ Period columns migration completed successfully")
-            
+            return True
+        
         except Exception as e:
-            print(f"⚠️ Migration error (might be already migrated): {str(e)}")
+            logger.warning("Migration error (might be already migrated): %s", e)
             self.conn.rollback()
+            return False
     
     def _migrate_add_subcategory_column(self):
         """Add subcategory column to expenses table if it doesn't exist"""
@@ -402,13 +1060,9 @@ class MultiUserDB:
             
             if self.use_postgres:
                 # PostgreSQL: Check if column exists
-                self._execute(cursor, """
-                    SELECT column_name FROM information_schema.columns 
-                    WHERE table_name = 'expenses' AND column_name = 'subcategory'
-                """)
-                existing_cols = [row['column_name'] for row in cursor.fetchall()]
+                has_subcategory, = self._pg_columns_exist(cursor, 'expenses', 'subcategory')
                 
-                if 'subcategory' not in existing_cols:
+                if not has_subcategory:
                     print("🔄 Adding subcategory column to expenses table...")
                     self._execute(cursor, 'ALTER TABLE expenses ADD COLUMN subcategory TEXT')
                     print("✅ Added subcategory column to expenses table")
@@ -424,10 +1078,174 @@ class MultiUserDB:
             
             self.conn.commit()
             print("✅ Subcategory column migration completed successfully")
+            return True
+        
+        except Exception as e:
+            logger.warning("Subcategory migration error (might be already migrated): %s", e)
+            self.conn.rollback()
+            return False
+    
+    def _migrate_add_income_period_columns(self):
+        """Add year/month columns to income, generated from the YYYY-MM-DD date text"""
+        try:
+            cursor = self.conn.cursor()
+            
+            if self.use_postgres:
+                # PostgreSQL: Check if columns exist
+                has_year, has_month = self._pg_columns_exist(cursor, 'income', 'year', 'month')
+                
+                # substring()::smallint is IMMUTABLE, unlike date::date, so it can back a stored column
+                if not has_year:
+                    print("🔄 Adding year column to income table...")
+                    self._execute(cursor, 'ALTER TABLE income ADD COLUMN year SMALLINT GENERATED ALWAYS AS (substring(date from 1 for 4)::smallint) STORED')
+                if not has_month:
+                    print("🔄 Adding month column to income table...")
+                    self._execute(cursor, 'ALTER TABLE income ADD COLUMN month SMALLINT GENERATED ALWAYS AS (substring(date from 6 for 2)::smallint) STORED')
+            else:
+                # SQLite: generated columns only show up in table_xinfo, and
+                # ALTER TABLE can only add VIRTUAL ones (still indexable)
+                cursor.execute("PRAGMA table_xinfo(income)")
+                columns = [column[1] for column in cursor.fetchall()]
+                
+                if 'year' not in columns:
+                    print("🔄 Adding year column to income table...")
+                    cursor.execute('ALTER TABLE income ADD COLUMN year INTEGER GENERATED ALWAYS AS (CAST(substr(date, 1, 4) AS INTEGER)) VIRTUAL')
+                if 'month' not in columns:
+                    print("🔄 Adding month column to income table...")
+                    cursor.execute('ALTER TABLE income ADD COLUMN month INTEGER GENERATED ALWAYS AS (CAST(substr(date, 6, 2) AS INTEGER)) VIRTUAL')
+            
+            self.conn.commit()
+            print("✅ Income period columns migration completed successfully")
+            return True
+        
+        except Exception as e:
+            logger.warning("Income period columns migration error (might be already migrated): %s", e)
+            self.conn.rollback()
+            return False
+    
+    def _migrate_monetary_columns(self):
+        """Convert aggregated money columns to NUMERIC(14,2) on PostgreSQL so SUMs need no casts"""
+        if not self.use_postgres:
+            return True  # SQLite stores them as REAL already
+        try:
+            cursor = self.conn.cursor()
+            
+            for table, column in (('income', 'amount'), ('allocations', 'allocated_amount')):
+                self._execute(cursor, """
+                    SELECT data_type, numeric_precision, numeric_scale FROM information_schema.columns 
+                    WHERE table_name = ? AND column_name = ?
+                """, (table, column))
+                col = cursor.fetchone()
+                
+                if col and (col['data_type'], col['numeric_precision'], col['numeric_scale']) != ('numeric', 14, 2):
+                    print(f"🔄 Converting {table}.{column} to NUMERIC(14,2)...")
+                    self._execute(cursor, f'ALTER TABLE {table} ALTER COLUMN {column} TYPE NUMERIC(14,2) USING {column}::numeric(14,2)')
+            
+            self.conn.commit()
+            print("✅ Monetary columns migration completed successfully")
+            return True
+        
+        except Exception as e:
+            logger.warning("Monetary columns migration error: %s", e)
+            self.conn.rollback()
+            return False
+    
+    def _migrate_cascade_foreign_keys(self):
+        """Make per-user tables cascade on user deletion so deleting a user is a single statement"""
+        try:
+            cursor = self.conn.cursor()
+            
+            for table in ('income', 'allocations', 'expenses', 'savings', 'monthly_settlements', 'monthly_liquidity'):
+                if self.use_postgres:
+                    self._execute(cursor, "SELECT to_regclass(?) IS NOT NULL as present", (table,))
+                    if not cursor.fetchone()['present']:
+                        continue
+                    self._execute(cursor, """
+                        SELECT conname, confdeltype FROM pg_constraint
+                        WHERE contype = 'f' AND conrelid = to_regclass(?) AND confrelid = to_regclass('users')
+                    """, (table,))
+                    constraints = cursor.fetchall()
+                    if any(c['confdeltype'] == 'c' for c in constraints):
+                        continue
+                    
+                    print(f"🔄 Adding ON DELETE CASCADE to {table}.user_id...")
+                    for c in constraints:
+                        self._execute(cursor, f'ALTER TABLE {table} DROP CONSTRAINT "{c["conname"]}"')
+                    # monthly_liquidity had no constraint before, so it may hold rows of deleted users
+                    self._execute(cursor, f'DELETE FROM {table} WHERE user_id NOT IN (SELECT id FROM users)')
+                    self._execute(cursor, f'ALTER TABLE {table} ADD CONSTRAINT {table}_user_id_fkey '
+                                          f'FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE')
+                else:
+                    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+                    row = cursor.fetchone()
+                    if row is None:
+                        continue
+                    cursor.execute(f'PRAGMA foreign_key_list({table})')
+                    if any(fk['table'] == 'users' and fk['on_delete'] == 'CASCADE' for fk in cursor.fetchall()):
+                        continue
+                    
+                    print(f"🔄 Rebuilding {table} with ON DELETE CASCADE...")
+                    # SQLite can't alter constraints: recreate from the stored DDL with the FK rewritten
+                    create_sql = re.sub(rf'^CREATE TABLE\s+"?{table}"?', f'CREATE TABLE {table}_new', row['sql'])
+                    create_sql, replaced = re.subn(r'REFERENCES\s+"?users"?\s*\(id\)',
+                                                   'REFERENCES users(id) ON DELETE CASCADE', create_sql)
+                    if not replaced:
+                        create_sql = create_sql.rstrip()[:-1] + ', FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE)'
+                    cursor.execute(create_sql)
+                    
+                    # Generated columns (hidden > 1) are computed, not copied
+                    cursor.execute(f'PRAGMA table_xinfo({table})')
+                    columns = ', '.join(col['name'] for col in cursor.fetchall() if col['hidden'] <= 1)
+                    cursor.execute(f'''
+                        INSERT INTO {table}_new ({columns})
+                        SELECT {columns} FROM {table} WHERE user_id IN (SELECT id FROM users)
+                    ''')
+                    
+                    # Dropping the old table also drops its indexes and triggers; both are recreated after the migrations
+                    cursor.execute(f'DROP TABLE {table}')
+                    cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+            
+            self.conn.commit()
+            return True
+        
+        except Exception as e:
+            logger.warning("Cascade foreign key migration error: %s", e)
+            self.conn.rollback()
+            return False
+    
+    def _migrate_password_hash_bytes(self):
+        """Convert hex-encoded SHA256 password hashes to the raw 32-byte digest"""
+        try:
+            cursor = self.conn.cursor()
+            
+            if self.use_postgres:
+                self._execute(cursor, """
+                    SELECT data_type FROM information_schema.columns 
+                    WHERE table_name = 'users' AND column_name = 'password_hash'
+                """)
+                if cursor.fetchone()['data_type'] != 'bytea':
+                    print("🔄 Converting users.password_hash to BYTEA...")
+                    # Anything that isn't a hex digest (never a valid login) is kept as its UTF-8 bytes
+                    self._execute(cursor, """
+                        ALTER TABLE users ALTER COLUMN password_hash TYPE BYTEA
+                        USING CASE WHEN password_hash ~ '^[0-9a-f]{64}$' THEN decode(password_hash, 'hex')
+                                   ELSE convert_to(password_hash, 'UTF8') END
+                    """)
+            else:
+                # SQLite keeps BLOBs as-is even in a TEXT column, so only the values need converting
+                cursor.execute("SELECT id, password_hash FROM users WHERE typeof(password_hash) = 'text' AND length(password_hash) = 64")
+                rows = [(bytes.fromhex(row['password_hash']), row['id']) for row in cursor.fetchall()]
+                if rows:
+                    print("🔄 Converting password hashes to raw digests...")
+                    cursor.executemany('UPDATE users SET password_hash = ? WHERE id = ?', rows)
             
+            self.conn.commit()
+            return True
+        
         except Exception as e:
-            print(f"⚠️ Subcategory migration error (might be already migrated): {str(e)}")
+            logger.warning("Password hash migration error: %s", e)
             self.conn.rollback()
+            return False
     
     def _migrate_add_payment_columns(self):
         """Add payment_mode and payment_details columns to expenses table if they don't exist"""
@@ -436,18 +1254,14 @@ class MultiUserDB:
             
             if self.use_postgres:
                 # PostgreSQL: Check if columns exist
-                self._execute(cursor, """
-                    SELECT column_name FROM information_schema.columns 
-                    WHERE table_name = 'expenses' AND column_name IN ('payment_mode', 'payment_details')
-                """)
-                existing_cols = [row['column_name'] for row in cursor.fetchall()]
+                has_payment_mode, has_payment_details = self._pg_columns_exist(cursor, 'expenses', 'payment_mode', 'payment_details')
                 
-                if 'payment_mode' not in existing_cols:
+                if not has_payment_mode:
                     print("🔄 Adding payment_mode column to expenses table...")
                     self._execute(cursor, 'ALTER TABLE expenses ADD COLUMN payment_mode TEXT')
                     print("✅ Added payment_mode column to expenses table")
                 
-                if 'payment_details' not in existing_cols:
+                if not has_payment_details:
                     print("🔄 Adding payment_details column to expenses table...")
                     self._execute(cursor, 'ALTER TABLE expenses ADD COLUMN payment_details TEXT')
                     print("✅ Added payment_details column to expenses table")
@@ -468,16 +1282,23 @@ class MultiUserDB:
             
             self.conn.commit()
             print("✅ Payment columns migration completed successfully")
-            
+            return True
+        
         except Exception as e:
-            print(f"⚠️ Payment columns migration error (might be already migrated): {str(e)}")
+            logger.warning("Payment columns migration error (might be already migrated): %s", e)
             self.conn.rollback()
+            return False
     
     # ==================== AUTHENTICATION & USER MANAGEMENT ====================
     
     def _hash_password(self, password):
         """Hash password using SHA256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        return _hash_password_cached(password)
+    
+    def _temp_password_hash(self):
+        """Hash a random throwaway password for an account that is claimed through its invite token"""
+        # Never looked up again, so skip the login memo instead of evicting real entries from it
+        return hashlib.sha256(secrets.token_urlsafe(16).encode()).digest()
     
     def _create_super_admin(self):
         """Create super admin user if it doesn't exist"""
@@ -495,16 +1316,15 @@ class MultiUserDB:
             
             # Create super admin (household_id is NULL)
             # Use ? placeholder - it will be auto-converted to %s for PostgreSQL
-            is_active_value = True if self.use_postgres else 1
             self._execute(cursor, '''
                 INSERT INTO users (household_id, email, password_hash, full_name, role, relationship, is_active)
                 VALUES (NULL, 'superadmin', ?, 'Super Administrator', 'superadmin', NULL, ?)
-            ''', (password_hash, is_active_value))
+            ''', (password_hash, self._true))
             
             self.conn.commit()
             print("✅ Super admin created successfully")
         except Exception as e:
-            print(f"❌ Error creating super admin: {str(e)}")
+            logger.error("Error creating super admin: %s", e)
             # Don't fail if super admin already exists
     
     def create_admin_user(self, email, password, full_name, household_name):
@@ -513,30 +1333,25 @@ class MultiUserDB:
             cursor = self.conn.cursor()
             
             # Create household
-            cursor.execute(
-                'INSERT INTO households (name) VALUES (?)',
-                (household_name,)
-            )
-            household_id = cursor.lastrowid
+            household_id = self._insert_returning_id(cursor, 'INSERT INTO households (name) VALUES (?)', (household_name,))
             
             # Create admin user
             password_hash = self._hash_password(password)
-            cursor.execute('''
+            user_id = self._insert_returning_id(cursor, '''
                 INSERT INTO users (household_id, email, password_hash, full_name, role, relationship)
                 VALUES (?, ?, ?, ?, 'admin', 'self')
             ''', (household_id, email, password_hash, full_name))
             
-            user_id = cursor.lastrowid
-            
             # Update household created_by
-            cursor.execute('UPDATE households SET created_by = ? WHERE id = ?', (user_id, household_id))
+            self._execute(cursor, 'UPDATE households SET created_by = ? WHERE id = ?', (user_id, household_id))
             
             self.conn.commit()
+            self._overview_cache.clear()
             return (True, user_id, "Admin account created successfully!")
         except sqlite3.IntegrityError:
             return (False, None, "Email already exists!")
         except Exception as e:
-            print(f"Error creating admin: {str(e)}")
+            logger.error("Error creating admin: %s", e)
             self.conn.rollback()
             return (False, None, f"Error: {str(e)}")
     
@@ -549,34 +1364,29 @@ class MultiUserDB:
             cursor = self.conn.cursor()
             password_hash = self._hash_password(password)
             
-            print(f"DEBUG: Authenticating user: {email}")
-            print(f"DEBUG: Password hash: {password_hash}")
+            logger.debug("Authenticating user: %s", email)
             
-            self._execute(cursor, '''
-                SELECT id, household_id, email, full_name, role, relationship, is_active
-                FROM users
-                WHERE email = ? AND password_hash = ?
-            ''', (email, password_hash))
+            # _execute hands back a fresh cursor if it had to reconnect
+            if self.use_postgres:
+                self._prepare_statement(cursor, 'auth_user')
+                cursor = self._execute(cursor, 'EXECUTE auth_user(?, ?)', (email, password_hash))
+            else:
+                cursor = self._execute(cursor, SQL_AUTHENTICATE_USER, (email, password_hash))
             
             user = cursor.fetchone()
             
-            print(f"DEBUG: Query result: {user}")
-            
             if user:
-                print(f"DEBUG: User found - is_active: {user['is_active']} (type: {type(user['is_active'])})")
+                logger.debug("User found - is_active: %r", user['is_active'])
                 if user['is_active']:
-                    print(f"DEBUG: User is active, authentication successful")
-                    return (True, dict(user))
+                    return (True, self._row_dict(user))
                 else:
-                    print(f"DEBUG: User is inactive")
+                    logger.debug("User %s is inactive", email)
                     return (False, None)
             else:
-                print(f"DEBUG: No user found with email and password")
+                logger.debug("No user found with email and password")
                 return (False, None)
-        except Exception as e:
-            print(f"Authentication error: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Authentication error")
             return (False, None)
     
     def generate_invite_token(self):
@@ -585,46 +1395,54 @@ class MultiUserDB:
     
     def create_member(self, household_id, email, full_name, relationship, created_by_admin_id):
         """Create a new family member and generate invite token"""
+        success, result = self.create_members_bulk(household_id, [
+            {'email': email, 'full_name': full_name, 'relationship': relationship}
+        ])
+        if not success:
+            return (False, result, None)
+        member_id, invite_token = result[0]
+        return (True, member_id, invite_token)
+    
+    def create_members_bulk(self, household_id, members):
+        """
+        Create several family members in one INSERT and one commit
+        members: list of dicts with email, full_name and relationship
+        Returns (True, [(member_id, invite_token), ...]) or (False, error code)
+        """
         try:
             cursor = self.conn.cursor()
             
-            # Generate temporary password and invite token
-            temp_password = secrets.token_urlsafe(16)
-            password_hash = self._hash_password(temp_password)
-            invite_token = self.generate_invite_token()
-            
-            # Create member with appropriate method for database type
-            if self.use_postgres:
-                self._execute(cursor, '''
-                    INSERT INTO users (household_id, email, password_hash, full_name, role, relationship, invite_token)
-                    VALUES (?, ?, ?, ?, 'member', ?, ?)
-                    RETURNING id
-                ''', (household_id, email, password_hash, full_name, relationship, invite_token))
-                member_id = cursor.fetchone()['id']
-            else:
-                self._execute(cursor, '''
-                    INSERT INTO users (household_id, email, password_hash, full_name, role, relationship, invite_token)
-                    VALUES (?, ?, ?, ?, 'member', ?, ?)
-                ''', (household_id, email, password_hash, full_name, relationship, invite_token))
-                member_id = cursor.lastrowid
+            # Each member gets a temporary password and invite token
+            invite_tokens = [self.generate_invite_token() for _ in members]
+            rows = [
+                (household_id, m['email'], self._temp_password_hash(),
+                 m['full_name'], 'member', m['relationship'], token)
+                for m, token in zip(members, invite_tokens)
+            ]
+            # Pair ids with tokens from the returned rows, not by position
+            inserted = self._bulk_insert(
+                cursor, 'users',
+                ('household_id', 'email', 'password_hash', 'full_name', 'role', 'relationship', 'invite_token'),
+                rows, returning=('id', 'invite_token'))
             
             self.conn.commit()
+            self._members_cache.pop(household_id, None)
+            self._overview_cache.clear()
             
-            return (True, member_id, invite_token)
+            return (True, [(row['id'], row['invite_token']) for row in inserted])
         except Exception as e:
             error_msg = str(e)
-            print(f"Error creating member: {error_msg}")
             self.conn.rollback()
             # Check if it's a unique constraint violation (email already exists)
             if 'unique' in error_msg.lower() or 'duplicate' in error_msg.lower():
+                logger.error("Error creating member: %s", error_msg)
                 if 'email' in error_msg.lower():
-                    return (False, "DUPLICATE_EMAIL", None)
-                return (False, "DUPLICATE_ENTRY", None)
+                    return (False, "DUPLICATE_EMAIL")
+                return (False, "DUPLICATE_ENTRY")
             else:
                 # Other error - log it
-                import traceback
-                traceback.print_exc()
-                return (False, "ERROR", None)
+                logger.exception("Error creating member")
+                return (False, "ERROR")
     
     def accept_invite(self, invite_token, new_password):
         """Accept invite and set new password"""
@@ -632,7 +1450,7 @@ class MultiUserDB:
             cursor = self.conn.cursor()
             
             # Find user by invite token
-            self._execute(cursor, 'SELECT id FROM users WHERE invite_token = ?', (invite_token,))
+            self._execute(cursor, 'SELECT id, household_id FROM users WHERE invite_token = ?', (invite_token,))
             user = cursor.fetchone()
             
             if not user:
@@ -647,35 +1465,33 @@ class MultiUserDB:
             ''', (password_hash, user['id']))
             
             self.conn.commit()
+            self._members_cache.pop(user['household_id'], None)
+            self._overview_cache.clear()
             return (True, "Password set successfully! You can now login.")
         except Exception as e:
-            print(f"Error accepting invite: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error accepting invite")
             self.conn.rollback()
             return (False, f"Error: {str(e)}")
     
     def get_household_members(self, household_id):
-        """Get all members of a household"""
+        """Get all members of a household (cached for MEMBERS_CACHE_TTL seconds)"""
+        fetched_at, members = self._members_cache.get(household_id, (0, None))
+        if time.time() - fetched_at < MEMBERS_CACHE_TTL:
+            return members.copy()
+        
         try:
-            # Use appropriate parameter placeholder
-            param_placeholder = '%s' if self.use_postgres else '?'
-            query = f'''
-                SELECT id, email, full_name, role, relationship, is_active, 
-                       invite_token, invite_token IS NOT NULL as pending_invite
+            df = self._fetch_frame('''
+                SELECT id, email, full_name, role, relationship, is_active, invite_token
                 FROM users
-                WHERE household_id = {param_placeholder}
+                WHERE household_id = ?
                 ORDER BY role DESC, full_name
-            '''
-            # Use engine for pandas queries if PostgreSQL
-            conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            df = pd.read_sql_query(query, conn_to_use, params=(household_id,))
-            print(f"DEBUG: get_household_members returned {len(df)} rows for household {household_id}")
-            return df
-        except Exception as e:
-            print(f"Error fetching members: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            ''', (household_id,))
+            df['pending_invite'] = df['invite_token'].notna()
+            logger.debug("get_household_members returned %d rows for household %s", len(df), household_id)
+            self._members_cache[household_id] = (time.time(), df)
+            return df.copy()
+        except Exception:
+            logger.exception("Error fetching members")
             return pd.DataFrame()
     
     def get_user_by_id(self, user_id):
@@ -688,20 +1504,23 @@ class MultiUserDB:
                 WHERE id = ?
             ''', (user_id,))
             user = cursor.fetchone()
-            return dict(user) if user else None
+            return self._row_dict(user) if user else None
         except Exception as e:
-            print(f"Error fetching user: {str(e)}")
+            logger.error("Error fetching user: %s", e)
             return None
     
     def deactivate_member(self, member_id):
         """Deactivate a family member"""
         try:
             cursor = self.conn.cursor()
-            cursor.execute('UPDATE users SET is_active = 0 WHERE id = ?', (member_id,))
+            self._execute(cursor, 'UPDATE users SET is_active = ? WHERE id = ?', (self._false, member_id))
             self.conn.commit()
+            self._admin_cache.clear()
+            self._members_cache.clear()
+            self._overview_cache.clear()
             return True
         except Exception as e:
-            print(f"Error deactivating member: {str(e)}")
+            logger.error("Error deactivating member: %s", e)
             return False
     
     def delete_member(self, member_id):
@@ -712,102 +1531,84 @@ class MultiUserDB:
         try:
             cursor = self.conn.cursor()
             
-            # Delete all member's financial data
-            self._execute(cursor, 'DELETE FROM expenses WHERE user_id = ?', (member_id,))
-            self._execute(cursor, 'DELETE FROM allocations WHERE user_id = ?', (member_id,))
-            self._execute(cursor, 'DELETE FROM income WHERE user_id = ?', (member_id,))
-            self._execute(cursor, 'DELETE FROM monthly_settlements WHERE user_id = ?', (member_id,))
-            
-            # Finally, delete the user account (this also invalidates the invite token)
+            # Delete the user account (this also invalidates the invite token);
+            # their financial data goes with it through ON DELETE CASCADE
             self._execute(cursor, 'DELETE FROM users WHERE id = ? AND role != ?', (member_id, 'admin'))
             
             self.conn.commit()
+            self._bump_version('expenses', 'allocations', 'income', 'savings')
+            self._admin_cache.clear()
+            self._members_cache.clear()
+            self._overview_cache.clear()
             return True
-        except Exception as e:
-            print(f"Error deleting member: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error deleting member")
             self.conn.rollback()
             return False
     
     # ==================== SUPER ADMIN METHODS ====================
     
+    def _cached_overview(self, name, load):
+        """Return a super admin overview result, re-running load at most every OVERVIEW_CACHE_TTL seconds"""
+        fetched_at, result = self._overview_cache.get(name, (0, None))
+        if time.time() - fetched_at >= OVERVIEW_CACHE_TTL:
+            result = load()
+            self._overview_cache[name] = (time.time(), result)
+        return result.copy()
+    
     def get_all_households(self):
-        """Get all households (for super admin)"""
+        """Get all households (for super admin, cached for OVERVIEW_CACHE_TTL seconds)"""
         try:
+            # Count members with a correlated subquery (an idx_users_household_role lookup per household)
+            # instead of joining every member row and de-duplicating with GROUP BY
             query = '''
                 SELECT h.id, h.name, h.is_active, h.created_at,
                        u.full_name as admin_name, u.email as admin_email,
-                       COUNT(DISTINCT m.id) as member_count
+                       (SELECT COUNT(*) FROM users m WHERE m.household_id = h.id) as member_count
                 FROM households h
                 LEFT JOIN users u ON h.created_by = u.id
-                LEFT JOIN users m ON m.household_id = h.id
-                GROUP BY h.id, h.name, h.is_active, h.created_at, u.full_name, u.email
                 ORDER BY h.created_at DESC
             '''
-            # Use engine for pandas queries if PostgreSQL
-            conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            df = pd.read_sql_query(query, conn_to_use)
-            print(f"DEBUG: get_all_households returned {len(df)} rows")
-            if not df.empty:
-                print(f"DEBUG: First row: {df.iloc[0].to_dict()}")
-            return df
-        except Exception as e:
-            print(f"Error fetching households: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            return self._cached_overview('households', lambda: self._fetch_frame(query, stream=True))
+        except Exception:
+            logger.exception("Error fetching households")
             return pd.DataFrame()
     
     def create_household_with_admin(self, household_name, admin_email, admin_name):
         """Super admin creates a new household with a family admin (using invite token)"""
         cursor = None
         try:
+            # Generate the invite token and temporary password (replaced when the admin uses the token)
+            # before the first statement opens the transaction
+            invite_token = self.generate_invite_token()
+            password_hash = self._temp_password_hash()
+            
             # Ensure connection is alive
             self._ensure_connection()
             cursor = self.conn.cursor()
             
             # Check if email already exists
-            self._execute(cursor, 'SELECT id FROM users WHERE email = ?', (admin_email,))
+            cursor = self._execute(cursor, 'SELECT id FROM users WHERE email = ?', (admin_email,))
             if cursor.fetchone():
                 if cursor:
                     cursor.close()
                 return (False, None, None, "Email already exists")
             
-            # Create household - use RETURNING for PostgreSQL
-            is_active_value = True if self.use_postgres else 1
-            if self.use_postgres:
-                self._execute(cursor, 'INSERT INTO households (name, is_active) VALUES (?, ?) RETURNING id', (household_name, is_active_value))
-                household_id = cursor.fetchone()['id']
-            else:
-                self._execute(cursor, 'INSERT INTO households (name, is_active) VALUES (?, ?)', (household_name, is_active_value))
-                household_id = cursor.lastrowid
-           
-            # Generate invite token for admin
-            invite_token = self.generate_invite_token()
-            
-            # Generate temporary password (will be replaced when admin uses invite token)
-            temp_password = secrets.token_urlsafe(16)
-            password_hash = self._hash_password(temp_password)
+            # Create household
+            household_id = self._insert_returning_id(cursor, 'INSERT INTO households (name, is_active) VALUES (?, ?)',
+                                                     (household_name, self._true))
             
-            # Create admin user with invite token - use RETURNING for PostgreSQL
-            if self.use_postgres:
-                self._execute(cursor, '''
-                    INSERT INTO users (household_id, email, password_hash, full_name, role, relationship, is_active, invite_token)
-                    VALUES (?, ?, ?, ?, 'admin', 'self', ?, ?)
-                    RETURNING id
-                ''', (household_id, admin_email, password_hash, admin_name, is_active_value, invite_token))
-                admin_id = cursor.fetchone()['id']
-            else:
-                self._execute(cursor, '''
-                    INSERT INTO users (household_id, email, password_hash, full_name, role, relationship, is_active, invite_token)
-                    VALUES (?, ?, ?, ?, 'admin', 'self', ?, ?)
-                ''', (household_id, admin_email, password_hash, admin_name, is_active_value, invite_token))
-                admin_id = cursor.lastrowid
+            # Create admin user with invite token
+            admin_id = self._insert_returning_id(cursor, '''
+                INSERT INTO users (household_id, email, password_hash, full_name, role, relationship, is_active, invite_token)
+                VALUES (?, ?, ?, ?, 'admin', 'self', ?, ?)
+            ''', (household_id, admin_email, password_hash, admin_name, self._true, invite_token))
             
             # Update household created_by
             self._execute(cursor, 'UPDATE households SET created_by = ? WHERE id = ?', (admin_id, household_id))
             
             self.conn.commit()
+            self._overview_cache.clear()
             
             if cursor:
                 cursor.close()
@@ -816,9 +1617,7 @@ class MultiUserDB:
         except Exception as e:
             if self.conn:
                 self.conn.rollback()
-            print(f"Error creating household: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error creating household")
             if cursor:
                 try:
                     cursor.close()
@@ -830,15 +1629,16 @@ class MultiUserDB:
         """Enable/disable a household"""
         try:
             cursor = self.conn.cursor()
-            # For PostgreSQL, need to handle boolean vs integer
+            # Booleans on PostgreSQL, 0/1 integers on SQLite
             if self.use_postgres:
-                self._execute(cursor, 'UPDATE households SET is_active = CASE WHEN is_active = TRUE THEN FALSE ELSE TRUE END WHERE id = ?', (household_id,))
+                self._execute(cursor, 'UPDATE households SET is_active = NOT is_active WHERE id = ?', (household_id,))
             else:
                 self._execute(cursor, 'UPDATE households SET is_active = CASE WHEN is_active = 1 THEN 0 ELSE 1 END WHERE id = ?', (household_id,))
             self.conn.commit()
+            self._overview_cache.clear()
             return True
         except Exception as e:
-            print(f"Error toggling household status: {str(e)}")
+            logger.error("Error toggling household status: %s", e)
             return False
     
     def delete_household(self, household_id):
@@ -846,26 +1646,19 @@ class MultiUserDB:
         try:
             cursor = self.conn.cursor()
             
-            # Get all users in the household
-            self._execute(cursor, 'SELECT id FROM users WHERE household_id = ?', (household_id,))
-            user_ids = [row['id'] for row in cursor.fetchall()]
-            
-            # Delete all user data
-            for user_id in user_ids:
-                self._execute(cursor, 'DELETE FROM expenses WHERE user_id = ?', (user_id,))
-                self._execute(cursor, 'DELETE FROM allocations WHERE user_id = ?', (user_id,))
-                self._execute(cursor, 'DELETE FROM income WHERE user_id = ?', (user_id,))
-                self._execute(cursor, 'DELETE FROM monthly_settlements WHERE user_id = ?', (user_id,))
-            
-            # Delete users and household
+            # Delete users (their data cascades) and household
             self._execute(cursor, 'DELETE FROM users WHERE household_id = ?', (household_id,))
             self._execute(cursor, 'DELETE FROM households WHERE id = ?', (household_id,))
             
             self.conn.commit()
+            self._bump_version('expenses', 'allocations', 'income', 'savings')
+            self._admin_cache.pop(household_id, None)
+            self._members_cache.pop(household_id, None)
+            self._overview_cache.clear()
             return (True, "Household deleted successfully")
         except Exception as e:
             self.conn.rollback()
-            print(f"Error deleting household: {str(e)}")
+            logger.error("Error deleting household: %s", e)
             return (False, str(e))
     
     def get_household_members_for_admin(self, household_id):
@@ -881,14 +1674,12 @@ class MultiUserDB:
             
             members = cursor.fetchall()
             return [dict(member) for member in members]
-        except Exception as e:
-            print(f"Error fetching household members: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error fetching household members")
             return []
     
     def get_all_users_super_admin(self):
-        """Get all users across all households (for super admin)"""
+        """Get all users across all households (for super admin, cached for OVERVIEW_CACHE_TTL seconds)"""
         try:
             query = '''
                 SELECT u.id, u.email, u.full_name, u.role, u.is_active,
@@ -898,75 +1689,66 @@ class MultiUserDB:
                 WHERE u.role != 'superadmin'
                 ORDER BY h.name, u.role DESC, u.full_name
             '''
-            # Use engine for pandas queries if PostgreSQL
-            conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            df = pd.read_sql_query(query, conn_to_use)
-            print(f"DEBUG: get_all_users_super_admin returned {len(df)} rows")
-            if not df.empty:
-                print(f"DEBUG: First row: {df.iloc[0].to_dict()}")
-            return df
-        except Exception as e:
-            print(f"Error fetching users: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            return self._cached_overview('users', lambda: self._fetch_frame(query, stream=True))
+        except Exception:
+            logger.exception("Error fetching users")
             return pd.DataFrame()
     
     def get_system_statistics(self):
-        """Get system-wide statistics (for super admin)"""
+        """Get system-wide statistics (for super admin, cached for OVERVIEW_CACHE_TTL seconds)"""
         try:
-            cursor = self.conn.cursor()
-            
-            stats = {}
-            
-            # Total households
-            self._execute(cursor, 'SELECT COUNT(*) as count FROM households')
-            stats['total_households'] = cursor.fetchone()['count']
-            
-            # Active households  
-            is_active_value = True if self.use_postgres else 1
-            self._execute(cursor, 'SELECT COUNT(*) as count FROM households WHERE is_active = ?', (is_active_value,))
-            stats['active_households'] = cursor.fetchone()['count']
-            
-            # Total users (excluding super admin)
-            self._execute(cursor, "SELECT COUNT(*) as count FROM users WHERE role != 'superadmin'")
-            stats['total_users'] = cursor.fetchone()['count']
-            
-            # Total admins
-            self._execute(cursor, "SELECT COUNT(*) as count FROM users WHERE role = 'admin'")
-            stats['total_admins'] = cursor.fetchone()['count']
-            
-            # Total members
-            self._execute(cursor, "SELECT COUNT(*) as count FROM users WHERE role = 'member'")
-            stats['total_members'] = cursor.fetchone()['count']
-            
-            return stats
+            return self._cached_overview('statistics', self._query_system_statistics)
         except Exception as e:
-            print(f"Error getting statistics: {str(e)}")
+            logger.error("Error getting statistics: %s", e)
             return {}
     
+    def _query_system_statistics(self):
+        """Run the system statistics query for get_system_statistics"""
+        with closing(self.conn.cursor()) as cursor:
+            # All five counts in one round-trip, scanning each table once with conditional counts
+            self._execute(cursor, '''
+                SELECT h.total_households, h.active_households,
+                       u.total_users, u.total_admins, u.total_members
+                FROM (
+                    SELECT COUNT(*) as total_households,
+                           COUNT(CASE WHEN is_active = ? THEN 1 END) as active_households
+                    FROM households
+                ) h
+                CROSS JOIN (
+                    SELECT COUNT(CASE WHEN role != 'superadmin' THEN 1 END) as total_users,
+                           COUNT(CASE WHEN role = 'admin' THEN 1 END) as total_admins,
+                           COUNT(CASE WHEN role = 'member' THEN 1 END) as total_members
+                    FROM users
+                ) u
+            ''', (self._true,))
+            return dict(cursor.fetchone())
+    
     def promote_member_to_admin(self, user_id, household_id):
         """Promote a member to family admin (super admin only)"""
         try:
             cursor = self.conn.cursor()
             
             # Update user role to admin
-            self._execute(cursor, '''
+            cursor = self._execute(cursor, '''
                 UPDATE users 
                 SET role = 'admin', relationship = 'self'
                 WHERE id = ? AND household_id = ?
             ''', (user_id, household_id))
             
-            # Update household created_by if needed
-            self._execute(cursor, 'SELECT created_by FROM households WHERE id = ?', (household_id,))
-            result = cursor.fetchone()
-            if result and not result['created_by']:
-                self._execute(cursor, 'UPDATE households SET created_by = ? WHERE id = ?', (user_id, household_id))
+            # Record the new admin as household creator if it has none; the IS NULL check in the
+            # UPDATE itself replaces a separate SELECT of created_by
+            if cursor.rowcount > 0:
+                self._execute(cursor, 'UPDATE households SET created_by = ? WHERE id = ? AND created_by IS NULL',
+                              (user_id, household_id))
             
             self.conn.commit()
+            self._admin_cache.pop(household_id, None)
+            self._members_cache.pop(household_id, None)
+            self._overview_cache.clear()
             return (True, "User promoted to family admin successfully")
         except Exception as e:
             self.conn.rollback()
-            print(f"Error promoting user: {str(e)}")
+            logger.error("Error promoting user: %s", e)
             return (False, str(e))
     
     def demote_admin_to_member(self, user_id, household_id):
@@ -974,42 +1756,40 @@ class MultiUserDB:
         try:
             cursor = self.conn.cursor()
             
-            # Count current admins in household
-            is_active_value = True if self.use_postgres else 1
-            self._execute(cursor, 
-                "SELECT COUNT(*) as count FROM users WHERE household_id = ? AND role = 'admin' AND is_active = ?",
-                (household_id, is_active_value))
-            result = cursor.fetchone()
-            admin_count = result['count'] if result else 0
+            # Demote to member only while another active admin remains; the guard lives in the
+            # UPDATE so the count and the write happen in one statement
+            cursor = self._execute(cursor, '''
+                UPDATE users SET role = 'member'
+                WHERE id = ? AND household_id = ? AND role = 'admin'
+                  AND (SELECT COUNT(*) FROM users WHERE household_id = ? AND role = 'admin' AND is_active = ?) > 1
+            ''', (user_id, household_id, household_id, self._true))
             
             # Prevent demotion if only one admin
-            if admin_count <= 1:
+            if cursor.rowcount == 0:
+                self.conn.rollback()
                 return (False, "Cannot demote the only admin. Promote another member first.")
             
-            # Demote to member
-            self._execute(cursor, 
-                "UPDATE users SET role = 'member' WHERE id = ? AND household_id = ?",
-                (user_id, household_id))
-            
             self.conn.commit()
+            self._admin_cache.pop(household_id, None)
+            self._members_cache.pop(household_id, None)
+            self._overview_cache.clear()
             return (True, "Admin demoted to member successfully")
         except Exception as e:
             self.conn.rollback()
-            print(f"Error demoting admin: {str(e)}")
+            logger.error("Error demoting admin: %s", e)
             return (False, str(e))
     
     def count_household_admins(self, household_id):
         """Count active admins in a household"""
         try:
             cursor = self.conn.cursor()
-            is_active_value = True if self.use_postgres else 1
             self._execute(cursor,
                 "SELECT COUNT(*) as count FROM users WHERE household_id = ? AND role = 'admin' AND is_active = ?",
-                (household_id, is_active_value))
+                (household_id, self._true))
             result = cursor.fetchone()
             return result['count'] if result else 0
         except Exception as e:
-            print(f"Error counting admins: {str(e)}")
+            logger.error("Error counting admins: %s", e)
             return 0
     
     def reset_user_password(self, user_id):
@@ -1021,8 +1801,7 @@ class MultiUserDB:
             new_token = self.generate_invite_token()
             
             # Generate temp password (user must use token to set real password)
-            temp_password = secrets.token_urlsafe(16)
-            password_hash = self._hash_password(temp_password)
+            password_hash = self._temp_password_hash()
             
             # Update user with new token and temp password (invalidates old password)
             self._execute(cursor, '''
@@ -1032,15 +1811,21 @@ class MultiUserDB:
             ''', (password_hash, new_token, user_id))
             
             self.conn.commit()
+            self._members_cache.clear()
+            self._overview_cache.clear()
             return (True, new_token, "Password reset successfully")
         except Exception as e:
             self.conn.rollback()
-            print(f"Error resetting password: {str(e)}")
+            logger.error("Error resetting password: %s", e)
             return (False, None, str(e))
     
     def add_member_to_family_super_admin(self, household_id, email, full_name, relationship):
         """Super admin adds a new member to a family"""
         try:
+            # Generate temporary password and invite token before the transaction starts
+            password_hash = self._temp_password_hash()
+            invite_token = self.generate_invite_token()
+            
             cursor = self.conn.cursor()
             
             # Check if email already exists
@@ -1048,33 +1833,18 @@ class MultiUserDB:
             if cursor.fetchone():
                 return (False, None, "Email already exists")
             
-            # Generate temporary password and invite token
-            temp_password = secrets.token_urlsafe(16)
-            password_hash = self._hash_password(temp_password)
-            invite_token = self.generate_invite_token()
-            
-            # Create member with appropriate method for database type
-            is_active_value = True if self.use_postgres else 1
-            if self.use_postgres:
-                self._execute(cursor, '''
-                    INSERT INTO users (household_id, email, password_hash, full_name, role, relationship, invite_token, is_active)
-                    VALUES (?, ?, ?, ?, 'member', ?, ?, ?)
-                    RETURNING id
-                ''', (household_id, email, password_hash, full_name, relationship, invite_token, is_active_value))
-                member_id = cursor.fetchone()['id']
-            else:
-                self._execute(cursor, '''
-                    INSERT INTO users (household_id, email, password_hash, full_name, role, relationship, invite_token, is_active)
-                    VALUES (?, ?, ?, ?, 'member', ?, ?, ?)
-                ''', (household_id, email, password_hash, full_name, relationship, invite_token, is_active_value))
-                member_id = cursor.lastrowid
+            # Create member
+            member_id = self._insert_returning_id(cursor, '''
+                INSERT INTO users (household_id, email, password_hash, full_name, role, relationship, invite_token, is_active)
+                VALUES (?, ?, ?, ?, 'member', ?, ?, ?)
+            ''', (household_id, email, password_hash, full_name, relationship, invite_token, self._true))
             
             self.conn.commit()
+            self._members_cache.pop(household_id, None)
+            self._overview_cache.clear()
             return (True, member_id, invite_token)
         except Exception as e:
-            print(f"Error adding member to family: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error adding member to family")
             self.conn.rollback()
             return (False, None, str(e))
     
@@ -1082,98 +1852,90 @@ class MultiUserDB:
     # ==================== INCOME OPERATIONS (USER-SCOPED) ====================
     
     def add_income(self, user_id, date, source, amount):
-        """Add a new income entry for a user"""
-        try:
-            cursor = self.conn.cursor()
-            self._execute(cursor,
-                'INSERT INTO income (user_id, date, source, amount) VALUES (?, ?, ?, ?)',
-                (user_id, date, source, float(amount))
-            )
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error adding income: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            self.conn.rollback()
+        """Add a new income entry for a user, returning its id"""
+        try:
+            with self._tx() as (cursor, commit):
+                income_id = self._insert_returning_id(cursor, SQL_INSERT_INCOME, (user_id, date, source, float(amount)))
+                commit()
+                self._bump_version('income')
+                return income_id
+        except Exception:
+            logger.exception("Error adding income")
             return False
     
     def get_all_income(self, user_id):
         """Get all income entries for a user"""
         try:
-            query = 'SELECT date as "Date", source as "Source", amount as "Amount" FROM income WHERE user_id = ? ORDER BY date DESC'
             # Use engine for pandas queries if PostgreSQL
             conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            if self.use_postgres and self.engine:
-                # For PostgreSQL, replace ? with parameter placeholder
-                query = 'SELECT date as "Date", source as "Source", amount as "Amount" FROM income WHERE user_id = %s ORDER BY date DESC'
-            df = pd.read_sql_query(query, conn_to_use, params=(user_id,))
+            df = self._read_sql_chunked(self._sql['get_all_income'], conn_to_use, (user_id,))
             return df
-        except Exception as e:
-            print(f"Error fetching income: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error fetching income")
             return pd.DataFrame(columns=["Date", "Source", "Amount"])
     
     def get_income_with_ids(self, user_id):
         """Get all income entries with IDs for editing"""
         try:
-            query = 'SELECT id, date, source, amount FROM income WHERE user_id = ? ORDER BY date DESC'
             # Use engine for pandas queries if PostgreSQL
             conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            if self.use_postgres and self.engine:
-                # For PostgreSQL, replace ? with parameter placeholder
-                query = 'SELECT id, date, source, amount FROM income WHERE user_id = %s ORDER BY date DESC'
-            df = pd.read_sql_query(query, conn_to_use, params=(user_id,))
+            df = self._read_sql_chunked(self._sql['get_income_with_ids'], conn_to_use, (user_id,))
             return df
-        except Exception as e:
-            print(f"Error fetching income with IDs: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error fetching income with IDs")
             return pd.DataFrame(columns=["id", "date", "source", "amount"])
 
     
+    def get_income_rows(self, user_id, year=None, month=None):
+        """Get income entries with IDs as a list of dicts (no DataFrame), optionally filtered by period"""
+        try:
+            if year and month:
+                return self._fetch_rows(self._sql['get_income_with_ids_period'], (user_id, *_month_bounds(year, month)))
+            return self._fetch_rows(self._sql['get_income_with_ids'], (user_id,))
+        except Exception:
+            logger.exception("Error fetching income rows")
+            return []
+    
     def update_income(self, income_id, user_id, date, source, amount):
         """Update an existing income entry"""
         try:
-            cursor = self.conn.cursor()
-            self._execute(cursor,
-                'UPDATE income SET date = ?, source = ?, amount = ? WHERE id = ? AND user_id = ?',
-                (date, source, float(amount), income_id, user_id)
-            )
-            self.conn.commit()
-            return True
+            with self._tx() as (cursor, commit):
+                self._execute(cursor,
+                    'UPDATE income SET date = ?, source = ?, amount = ? WHERE id = ? AND user_id = ?',
+                    (date, source, float(amount), income_id, user_id)
+                )
+                commit()
+                self._bump_version('income')
+                return True
         except Exception as e:
-            print(f"Error updating income: {str(e)}")
+            logger.error("Error updating income: %s", e)
             return False
     
     def delete_income(self, income_id, user_id):
         """Delete an income entry"""
         try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, 'DELETE FROM income WHERE id = ? AND user_id = ?', (income_id, user_id))
-            self.conn.commit()
-            return True
+            with self._tx() as (cursor, commit):
+                self._execute(cursor, 'DELETE FROM income WHERE id = ? AND user_id = ?', (income_id, user_id))
+                commit()
+                self._bump_version('income')
+                return True
         except Exception as e:
-            print(f"Error deleting income: {str(e)}")
+            logger.error("Error deleting income: %s", e)
             return False
     
     def get_total_income(self, user_id, year, month):
         """Get total income amount for a specific user and period"""
         try:
-            cursor = self.conn.cursor()
-            # Income dates are stored as strings in format YYYY-MM-DD
-            # Filter by year and month using LIKE pattern matching
-            year_month_pattern = f"{year}-{month:02d}-%"
-            self._execute(cursor, '''
-                SELECT SUM(amount) as total
+            # Income dates are stored as YYYY-MM-DD strings, so a half-open range
+            # selects the month and can seek idx_inc_ud(user_id, date)
+            total = self._fetch_total('''
+                SELECT COALESCE(SUM(amount), 0) as total
                 FROM income
-                WHERE user_id = ? AND date LIKE ?
-            ''', (user_id, year_month_pattern))
-            result = cursor.fetchone()
-            return float(result['total']) if result and result['total'] else 0.0
+                WHERE user_id = ? AND date >= ? AND date < ?
+            ''', (user_id, *_month_bounds(year, month)))
+            return float(total)
         except Exception as e:
-            print(f"Error getting total income: {str(e)}")
+            logger.error("Error getting total income: %s", e)
             return 0.0
     
     # ==================== ALLOCATION OPERATIONS (USER-SCOPED) ====================
@@ -1181,61 +1943,35 @@ class MultiUserDB:
     def add_allocation(self, user_id, category, allocated_amount, year, month):
         """Add a new allocation for a category with period"""
         try:
-            cursor = self.conn.cursor()
-            balance = allocated_amount
-            self._execute(cursor,
-                'INSERT INTO allocations (user_id, category, year, month, allocated_amount, spent_amount, balance) VALUES (?, ?, ?, ?, ?, 0, ?)',
-                (user_id, category, year, month, float(allocated_amount), float(balance))
-            )
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error adding allocation: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            self.conn.rollback()
+            with self._tx() as (cursor, commit):
+                balance = allocated_amount
+                self._execute(cursor,
+                    'INSERT INTO allocations (user_id, category, year, month, allocated_amount, spent_amount, balance) VALUES (?, ?, ?, ?, ?, 0, ?)',
+                    (user_id, category, year, month, float(allocated_amount), float(balance))
+                )
+                commit()
+                self._bump_version('allocations')
+                return True
+        except Exception:
+            logger.exception("Error adding allocation")
             return False
     
     def get_all_allocations(self, user_id, year=None, month=None):
         """Get all allocations for a user, optionally filtered by period"""
         try:
             if year and month:
-                query = '''
-                    SELECT 
-                        id,
-                        category as "Category", 
-                        allocated_amount as "Allocated Amount", 
-                        spent_amount as "Spent Amount", 
-                        balance as "Balance" 
-                    FROM allocations 
-                    WHERE user_id = ? AND year = ? AND month = ?
-                    ORDER BY category
-                '''
+                query = self._sql['get_all_allocations_period']
                 params = (user_id, year, month)
+                prepared = 'alloc_period'
             else:
-                query = '''
-                    SELECT 
-                        id,
-                        category as "Category", 
-                        allocated_amount as "Allocated Amount", 
-                        spent_amount as "Spent Amount", 
-                        balance as "Balance" 
-                    FROM allocations 
-                    WHERE user_id = ?
-                    ORDER BY category
-                '''
+                query = self._sql['get_all_allocations']
                 params = (user_id,)
+                prepared = None
             
-            # Use engine for pandas queries if PostgreSQL
-            conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            if self.use_postgres and self.engine:
-                query = query.replace('?', '%s')
-            df = pd.read_sql_query(query, conn_to_use, params=params)
-            return df
-        except Exception as e:
-            print(f"Error fetching allocations: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            # One budget period is a few dozen rows; no need for read_sql here
+            return self._fetch_frame(query, params, prepared)
+        except Exception:
+            logger.exception("Error fetching allocations")
             return pd.DataFrame(columns=["Category", "Allocated Amount", "Spent Amount", "Balance"])
     
     def get_categories(self, user_id, year=None, month=None):
@@ -1249,7 +1985,7 @@ class MultiUserDB:
             rows = cursor.fetchall()
             return [row['category'] for row in rows]
         except Exception as e:
-            print(f"Error fetching categories: {str(e)}")
+            logger.error("Error fetching categories: %s", e)
             return []
     
     def get_past_allocations(self, user_id, exclude_year, exclude_month):
@@ -1262,462 +1998,457 @@ class MultiUserDB:
             current_date = datetime(exclude_year, exclude_month, 1)
             six_months_ago = current_date - timedelta(days=180)
             
-            # Get allocations from past 6 months, excluding current period
-            self._execute(cursor, '''
-                SELECT DISTINCT category, allocated_amount, year, month
-                FROM allocations
-                WHERE user_id = ?
-                  AND NOT (year = ? AND month = ?)
-                  AND ((year > ?) OR (year = ? AND month >= ?))
+            # Most recent allocation per category from the past 6 months, excluding current period;
+            # ROW_NUMBER keeps the de-duplication in the database on both PostgreSQL and SQLite
+            cursor = self._execute(cursor, '''
+                SELECT category, allocated_amount
+                FROM (
+                    SELECT category, allocated_amount, year, month,
+                           ROW_NUMBER() OVER (PARTITION BY category ORDER BY year DESC, month DESC) as rn
+                    FROM allocations
+                    WHERE user_id = ?
+                      AND NOT (year = ? AND month = ?)
+                      AND ((year > ?) OR (year = ? AND month >= ?))
+                ) latest
+                WHERE rn = 1
                 ORDER BY year DESC, month DESC, category
             ''', (user_id, 
                   exclude_year, exclude_month,
                   six_months_ago.year, six_months_ago.year, six_months_ago.month))
             
-            results = cursor.fetchall()
-            
-            # Get unique categories (most recent occurrence)
-            seen_categories = set()
-            unique_allocations = []
-            for row in results:
-                if row['category'] not in seen_categories:
-                    unique_allocations.append({
-                        'category': row['category'],
-                        'amount': float(row['allocated_amount'])
-                    })
-                    seen_categories.add(row['category'])
-            
-            return unique_allocations
-        except Exception as e:
-            print(f"Error getting past allocations: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            return [{'category': row['category'], 'amount': float(row['allocated_amount'])}
+                    for row in cursor.fetchall()]
+        except Exception:
+            logger.exception("Error getting past allocations")
             return []
     
     def get_allocations_with_ids(self, user_id, year=None, month=None):
         """Get all allocations with IDs for editing, optionally filtered by period"""
         try:
             if year and month:
-                query = 'SELECT id, category, year, month, allocated_amount, spent_amount, balance FROM allocations WHERE user_id = ? AND year = ? AND month = ? ORDER BY category'
+                query = self._sql['get_allocations_with_ids_period']
                 params = (user_id, year, month)
+                prepared = 'alloc_ids_period'
             else:
-                query = 'SELECT id, category, year, month, allocated_amount, spent_amount, balance FROM allocations WHERE user_id = ? ORDER BY category'
+                query = self._sql['get_allocations_with_ids']
                 params = (user_id,)
+                prepared = None
             
-            # Use engine for pandas queries if PostgreSQL
-            conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            if self.use_postgres and self.engine:
-                query = query.replace('?', '%s')
-            df = pd.read_sql_query(query, conn_to_use, params=params)
-            return df
-        except Exception as e:
-            print(f"Error fetching allocations with IDs: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            # One budget period is a few dozen rows; no need for read_sql here
+            return self._fetch_frame(query, params, prepared)
+        except Exception:
+            logger.exception("Error fetching allocations with IDs")
             return pd.DataFrame(columns=["id", "category", "year", "month", "allocated_amount", "spent_amount", "balance"])
 
     
     def update_allocation(self, allocation_id, user_id, category, allocated_amount, year, month):
         """Update an allocation entry by ID with period"""
         try:
-            cursor = self.conn.cursor()
-            
-            # Get current spent amount
-            self._execute(cursor,
-                'SELECT spent_amount FROM allocations WHERE id = ? AND user_id = ?',
-                (allocation_id, user_id)
-            )
-            result = cursor.fetchone()
-            if not result:
-                return False
-                
-            spent_amount = float(result['spent_amount'])
-            new_balance = float(allocated_amount) - spent_amount
-            
-            # Update the allocation with year/month
-            self._execute(cursor,
-                'UPDATE allocations SET category = ?, year = ?, month = ?, allocated_amount = ?, balance = ? WHERE id = ? AND user_id = ?',
-                (category, year, month, float(allocated_amount), new_balance, allocation_id, user_id)
-            )
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error updating allocation: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            self.conn.rollback()
+            with self._tx() as (cursor, commit):
+                # Update the allocation with year/month, recomputing the balance from the stored spent amount
+                cursor = self._execute(cursor,
+                    'UPDATE allocations SET category = ?, year = ?, month = ?, allocated_amount = ?, balance = ? - spent_amount WHERE id = ? AND user_id = ?',
+                    (category, year, month, float(allocated_amount), float(allocated_amount), allocation_id, user_id)
+                )
+                if cursor.rowcount == 0:
+                    logger.warning("Allocation %s not found", allocation_id)
+                    return False
+                commit()
+                self._bump_version('allocations')
+                return True
+        except Exception:
+            logger.exception("Error updating allocation")
             return False
     
     def update_allocation_spent(self, user_id, category, expense_amount, year, month):
         """Update spent amount and balance for a category when expense is added (for specific year/month)"""
         try:
-            cursor = self.conn.cursor()
-            
-            self._execute(cursor,
-                'SELECT allocated_amount, spent_amount FROM allocations WHERE user_id = ? AND category = ? AND year = ? AND month = ?',
-                (user_id, category, year, month)
-            )
-            row = cursor.fetchone()
-            
-            if not row:
-                print(f"Category '{category}' not found for period {year}-{month}")
-                return False
-            
-            allocated = float(row['allocated_amount'])
-            current_spent = float(row['spent_amount'])
-            
-            new_spent = current_spent + float(expense_amount)
-            new_balance = allocated - new_spent
-            
-            self._execute(cursor,
-                'UPDATE allocations SET spent_amount = ?, balance = ? WHERE user_id = ? AND category = ? AND year = ? AND month = ?',
-                (new_spent, new_balance, user_id, category, year, month)
-            )
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error updating allocation: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            with self._tx() as (cursor, commit):
+                if not self._apply_spent_delta(cursor, user_id, category, year, month, float(expense_amount)):
+                    logger.warning("Category '%s' not found for period %s-%s", category, year, month)
+                    return False
+                commit()
+                self._bump_version('allocations')
+                return True
+        except Exception:
+            logger.exception("Error updating allocation")
             return False
     
     def update_allocation_amount(self, user_id, category, new_allocated_amount):
         """Update allocated amount for a category"""
         try:
-            cursor = self.conn.cursor()
-            
-            cursor.execute(
-                'SELECT spent_amount FROM allocations WHERE user_id = ? AND category = ?',
-                (user_id, category)
-            )
-            row = cursor.fetchone()
-            
-            if not row:
-                print(f"Category '{category}' not found")
-                return False
-            
-            current_spent = float(row['spent_amount'])
-            new_balance = float(new_allocated_amount) - current_spent
-            
-            cursor.execute(
-                'UPDATE allocations SET allocated_amount = ?, balance = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ? AND category = ?',
-                (float(new_allocated_amount), new_balance, user_id, category)
-            )
-            self.conn.commit()
-            return True
+            with self._tx() as (cursor, commit):
+                cursor = self._execute(cursor,
+                    'UPDATE allocations SET allocated_amount = ?, balance = ? - spent_amount, updated_at = CURRENT_TIMESTAMP WHERE user_id = ? AND category = ?',
+                    (float(new_allocated_amount), float(new_allocated_amount), user_id, category)
+                )
+                
+                if cursor.rowcount == 0:
+                    logger.warning("Category '%s' not found", category)
+                    return False
+                
+                commit()
+                self._bump_version('allocations')
+                return True
         except Exception as e:
-            print(f"Error updating allocation amount: {str(e)}")
+            logger.error("Error updating allocation amount: %s", e)
             return False
     
     def delete_allocation(self, user_id, category):
         """Delete an allocation category"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM allocations WHERE user_id = ? AND category = ?', (user_id, category))
-            self.conn.commit()
-            return cursor.rowcount > 0
+            with self._tx() as (cursor, commit):
+                self._execute(cursor, 'DELETE FROM allocations WHERE user_id = ? AND category = ?', (user_id, category))
+                commit()
+                self._bump_version('allocations')
+                return cursor.rowcount > 0
         except Exception as e:
-            print(f"Error deleting allocation: {str(e)}")
+            logger.error("Error deleting allocation: %s", e)
             return False
     
     def delete_allocation_by_id(self, allocation_id, user_id):
         """Delete an allocation by ID"""
         try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, 'DELETE FROM allocations WHERE id = ? AND user_id = ?', (allocation_id, user_id))
-            self.conn.commit()
-            return cursor.rowcount > 0
+            with self._tx() as (cursor, commit):
+                self._execute(cursor, 'DELETE FROM allocations WHERE id = ? AND user_id = ?', (allocation_id, user_id))
+                commit()
+                self._bump_version('allocations')
+                return cursor.rowcount > 0
         except Exception as e:
-            print(f"Error deleting allocation: {str(e)}")
+            logger.error("Error deleting allocation: %s", e)
             return False
     
     # ==================== EXPENSE OPERATIONS (USER-SCOPED) ====================
     
-    def add_expense(self, user_id, date, category, amount, comment, subcategory=None, payment_mode=None, payment_details=None):
-        """Add a new expense and auto-update allocation"""
+    def _apply_spent_delta(self, cursor, user_id, category, year, month, delta):
+        """Shift an allocation's spent amount and balance by delta within the caller's transaction
+        
+        Returns whether a matching allocation existed.
+        """
+        cursor = self._execute(cursor, SQL_UPDATE_ALLOC_SPENT, (delta, delta, user_id, category, year, month))
+        return cursor.rowcount > 0
+    
+    def add_expense(self, user_id, date, category, amount, comment=None, subcategory=None, payment_mode=None, payment_details=None):
+        """Add a new expense and return the new id (the alloc_spent triggers update its allocation)"""
         try:
-            cursor = self.conn.cursor()
-            
-            self._execute(cursor,
-                'INSERT INTO expenses (user_id, date, category, amount, comment, subcategory, payment_mode, payment_details) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                (user_id, date, category, float(amount), comment, subcategory, payment_mode, payment_details)
-            )
-            
             # Extract year and month from date string (format: YYYY-MM-DD)
-            try:
-                year, month = int(date[:4]), int(date[5:7])
-                self.update_allocation_spent(user_id, category, amount, year, month)
-            except (ValueError, IndexError) as e:
-                print(f"Warning: Could not extract year/month from date '{date}': {e}")
-            
-            self.conn.commit()
-            return True
+            year, month = int(date[:4]), int(date[5:7])
+            with self._tx() as (cursor, commit):
+                expense_id = self._insert_returning_id(cursor, SQL_INSERT_EXPENSE,
+                    (user_id, year, month, date, category, float(amount), comment, subcategory, payment_mode, payment_details)
+                )
+                commit()
+                self._bump_version('expenses', 'allocations')
+                return expense_id
         except Exception as e:
-            print(f"Error adding expense: {str(e)}")
-            self.conn.rollback()
+            logger.error("Error adding expense: %s", e)
+            return False
+    
+    def add_expenses_batch(self, user_id, expenses):
+        """
+        Add several expenses in one transaction (the alloc_spent triggers update their allocations)
+        expenses: list of dicts with date, category, amount and optional comment,
+        subcategory, payment_mode and payment_details
+        Returns the new expense ids, or False on error
+        """
+        try:
+            rows = [_expense_params(user_id, e) for e in expenses]
+            with self._tx() as (cursor, commit):
+                expense_ids = self._bulk_insert(cursor, 'expenses', EXPENSE_COLUMNS, rows, return_ids=True)
+                commit()
+                self._bump_version('expenses', 'allocations')
+                return expense_ids
+        except Exception as e:
+            logger.error("Error adding expenses: %s", e)
+            return False
+    
+    def bulk_import_expenses(self, user_id, expenses):
+        """
+        Load many expenses at once (e.g. a CSV import) without returning their ids
+        expenses: list of dicts as for add_expenses_batch
+        Returns the number of expenses added, or False on error
+        """
+        try:
+            rows = [_expense_params(user_id, e) for e in expenses]
+            with self._tx() as (cursor, commit):
+                if self.use_postgres:
+                    # COPY streams every row in one protocol message instead of INSERT round-trips;
+                    # the alloc_spent trigger still updates allocations for each row
+                    data = io.StringIO(''.join('\t'.join(map(_copy_text, row)) + '\n' for row in rows))
+                    cursor.copy_expert(f"COPY expenses ({', '.join(EXPENSE_COLUMNS)}) FROM STDIN", data)
+                else:
+                    self._bulk_insert(cursor, 'expenses', EXPENSE_COLUMNS, rows)
+                commit()
+                self._bump_version('expenses', 'allocations')
+                return len(rows)
+        except Exception as e:
+            logger.error("Error importing expenses: %s", e)
             return False
     
     def get_all_expenses(self, user_id):
         """Get all expenses for a user"""
         try:
-            query = '''
-                SELECT 
-                    id,
-                    date as "Date", 
-                    category as "Category",
-                    subcategory as "Subcategory",
-                    amount as "Amount", 
-                    comment as "Comment",
-                    payment_mode as "Payment_Mode",
-                    payment_details as "Payment_Details"
-                FROM expenses 
-                WHERE user_id = ?
-                ORDER BY date DESC
-            '''
             # Use engine for pandas queries if PostgreSQL
             conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            if self.use_postgres and self.engine:
-                query = query.replace('?', '%s')
-            df = pd.read_sql_query(query, conn_to_use, params=(user_id,))
+            df = self._read_sql_chunked(self._sql['get_all_expenses'], conn_to_use, (user_id,))
             return df
-        except Exception as e:
-            print(f"Error fetching expenses: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error fetching expenses")
             return pd.DataFrame(columns=["id", "Date", "Category", "Subcategory", "Amount", "Comment", "Payment_Mode", "Payment_Details"])
     
+    def get_expense_rows(self, user_id, year=None, month=None):
+        """Get expenses (get_all_expenses columns) as a list of dicts (no DataFrame), optionally filtered by period"""
+        try:
+            if year and month:
+                return self._fetch_rows(self._sql['get_all_expenses_period'], (user_id, *_month_bounds(year, month)))
+            return self._fetch_rows(self._sql['get_all_expenses'], (user_id,))
+        except Exception:
+            logger.exception("Error fetching expense rows")
+            return []
+    
+    def get_expenses_page(self, user_id, limit=50, before=None):
+        """
+        Get one page of expenses (get_all_expenses columns) as a list of dicts, newest first
+        before: (date, id) of the last row of the previous page; None for the first page
+        Keyset paging walks idx_exp_ud, so later pages cost the same as the first.
+        """
+        try:
+            columns = 'id, date as "Date", category as "Category", subcategory as "Subcategory", amount as "Amount", ' \
+                      'comment as "Comment", payment_mode as "Payment_Mode", payment_details as "Payment_Details"'
+            if before is None:
+                return self._fetch_rows(f'SELECT {columns} FROM expenses WHERE user_id = ? '
+                                        f'ORDER BY date DESC, id DESC LIMIT ?', (user_id, int(limit)))
+            before_date, before_id = before
+            return self._fetch_rows(f'SELECT {columns} FROM expenses WHERE user_id = ? '
+                                    f'AND (date < ? OR (date = ? AND id < ?)) '
+                                    f'ORDER BY date DESC, id DESC LIMIT ?',
+                                    (user_id, before_date, before_date, int(before_id), int(limit)))
+        except Exception:
+            logger.exception("Error fetching expense page")
+            return []
+    
     def get_total_expenses(self, user_id):
         """Calculate total expenses for a user"""
         try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, 'SELECT SUM(amount) as total FROM expenses WHERE user_id = ?', (user_id,))
-            result = cursor.fetchone()
-            return result['total'] if result['total'] else 0
+            return self._cached_total('expenses', (user_id,),
+                                      lambda: self._fetch_total(SQL_SUM_EXPENSES, (user_id,)))
         except Exception as e:
-            print(f"Error calculating total expenses: {str(e)}")
+            logger.error("Error calculating total expenses: %s", e)
             return 0
     
     def get_expenses_by_category(self, user_id, category):
         """Get expenses filtered by category"""
         try:
-            query = '''
-                SELECT 
-                    date as "Date", 
-                    category as "Category", 
-                    amount as "Amount", 
-                    comment as "Comment" 
-                FROM expenses 
-                WHERE user_id = ? AND category = ?
-                ORDER BY date DESC
-            '''
-            df = pd.read_sql_query(query, self.conn, params=(user_id, category))
+            conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
+            df = pd.read_sql_query(self._sql['get_expenses_by_category'], conn_to_use, params=(user_id, category))
             return df
         except Exception as e:
-            print(f"Error fetching expenses by category: {str(e)}")
+            logger.error("Error fetching expenses by category: %s", e)
             return pd.DataFrame(columns=["Date", "Category", "Amount", "Comment"])
     
     def get_expenses_with_ids(self, user_id):
         """Get all expenses with IDs for editing"""
         try:
-            query = 'SELECT id, date, category, amount, subcategory, comment, payment_mode, payment_details FROM expenses WHERE user_id = ? ORDER BY date DESC'
             # Use engine for pandas queries if PostgreSQL
             conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            if self.use_postgres and self.engine:
-                # For PostgreSQL, replace ? with parameter placeholder
-                query = 'SELECT id, date, category, amount, subcategory, comment, payment_mode, payment_details FROM expenses WHERE user_id = %s ORDER BY date DESC'
-            df = pd.read_sql_query(query, conn_to_use, params=(user_id,))
+            df = self._read_sql_chunked(self._sql['get_expenses_with_ids'], conn_to_use, (user_id,))
             return df
-        except Exception as e:
-            print(f"Error fetching expenses with IDs: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error fetching expenses with IDs")
             return pd.DataFrame(columns=["id", "date", "category", "amount", "subcategory", "comment", "payment_mode", "payment_details"])
 
     
-    def update_expense(self, expense_id, user_id, date, category, amount, old_category, old_amount, comment, subcategory=None, old_date=None, payment_mode=None, payment_details=None):
-        """Update an existing expense and adjust allocations"""
+    def update_expense(self, expense_id, user_id, date, category, amount, old_category=None, old_amount=None, comment=None, subcategory=None, old_date=None, payment_mode=None, payment_details=None):
+        """Update an existing expense (the alloc_spent triggers move the amount between allocations)
+        
+        old_category, old_amount and old_date are accepted for compatibility;
+        the stored row is the source of truth for what gets reverted.
+        """
         try:
-            cursor = self.conn.cursor()
-            
-            # Extract year/month from old and new dates
-            try:
-                if old_date:
-                    old_year, old_month = int(old_date[:4]), int(old_date[5:7])
-                else:
-                    # If old_date not provided, use the date from the expense
-                    self._execute(cursor, 'SELECT date FROM expenses WHERE id = ? AND user_id = ?', (expense_id, user_id))
-                    old_expense = cursor.fetchone()
-                    if old_expense:
-                        old_date_str = old_expense['date']
-                        old_year, old_month = int(old_date_str[:4]), int(old_date_str[5:7])
-                    else:
-                        print(f"Warning: Could not find old expense {expense_id}")
-                        old_year, old_month = None, None
+            new_year, new_month = int(date[:4]), int(date[5:7])
+            with self._tx(immediate=True) as (cursor, commit):
+                self._execute(cursor, SQL_SELECT_EXPENSE_FIELDS, (expense_id, user_id))
+                current = cursor.fetchone()
                 
-                new_year, new_month = int(date[:4]), int(date[5:7])
-            except (ValueError, IndexError) as e:
-                print(f"Warning: Could not extract year/month from dates: {e}")
-                old_year, old_month, new_year, new_month = None, None, None, None
-            
-            # Revert old allocation if we have old date info
-            if old_year and old_month:
-                self._execute(cursor,
-                    'SELECT allocated_amount, spent_amount FROM allocations WHERE user_id = ? AND category = ? AND year = ? AND month = ?',
-                    (user_id, old_category, old_year, old_month)
-                )
-                old_row = cursor.fetchone()
-                if old_row:
-                    old_allocated = float(old_row['allocated_amount'])
-                    old_spent = float(old_row['spent_amount'])
-                    new_old_spent = old_spent - float(old_amount)
-                    new_old_balance = old_allocated - new_old_spent
-                    self._execute(cursor,
-                        'UPDATE allocations SET spent_amount = ?, balance = ? WHERE user_id = ? AND category = ? AND year = ? AND month = ?',
-                        (new_old_spent, new_old_balance, user_id, old_category, old_year, old_month)
-                    )
-            
-            # Update new allocation if we have new date info
-            if new_year and new_month:
+                if not current:
+                    logger.warning("Expense %s not found", expense_id)
+                    return False
+                
+                # Nothing changed - skip the write path entirely
+                if (
+                    current['date'] == date and current['category'] == category
+                    and float(current['amount']) == float(amount)
+                    and current['comment'] == comment and current['subcategory'] == subcategory
+                    and current['payment_mode'] == payment_mode and current['payment_details'] == payment_details
+                ):
+                    commit()
+                    return True
+                
+                # Update expense
+                logger.debug("Updating expense %s for user %s: date=%s category=%s amount=%s",
+                             expense_id, user_id, date, category, amount)
                 self._execute(cursor,
-                    'SELECT allocated_amount, spent_amount FROM allocations WHERE user_id = ? AND category = ? AND year = ? AND month = ?',
-                    (user_id, category, new_year, new_month)
+                    'UPDATE expenses SET year = ?, month = ?, date = ?, category = ?, amount = ?, comment = ?, subcategory = ?, payment_mode = ?, payment_details = ? WHERE id = ? AND user_id = ?',
+                    (new_year, new_month, date, category, float(amount), comment, subcategory, payment_mode, payment_details, expense_id, user_id)
                 )
-                new_row = cursor.fetchone()
-                if new_row:
-                    new_allocated = float(new_row['allocated_amount'])
-                    new_spent = float(new_row['spent_amount'])
-                    new_new_spent = new_spent + float(amount)
-                    new_new_balance = new_allocated - new_new_spent
-                    self._execute(cursor,
-                        'UPDATE allocations SET spent_amount = ?, balance = ? WHERE user_id = ? AND category = ? AND year = ? AND month = ?',
-                        (new_new_spent, new_new_balance, user_id, category, new_year, new_month)
-                    )
-            
-            # Update expense
-            print(f"DB: d={date} c={category} a={amount} cm={comment} s={subcategory} pm={payment_mode} pd={payment_details} eid={expense_id} uid={user_id}")
-            # SQL parameter positions: 1=date, 2=category, 3=amount, 4=comment, 5=subcategory, 6=payment_mode, 7=payment_details, 8=id, 9=user_id
-            self._execute(cursor,
-                'UPDATE expenses SET date = ?, category = ?, amount = ?, comment = ?, subcategory = ?, payment_mode = ?, payment_details = ? WHERE id = ? AND user_id = ?',
-                (date, category, float(amount), comment, subcategory, payment_mode, payment_details, expense_id, user_id)
-            )
-            
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error updating expense: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            self.conn.rollback()
+                
+                commit()
+                self._bump_version('expenses', 'allocations')
+                return True
+        except Exception:
+            logger.exception("Error updating expense")
             return False
     
-    def delete_expense(self, expense_id, user_id, category, amount):
-        """Delete an expense and update allocation"""
+    def delete_expense(self, expense_id, user_id=None, category=None, amount=None):
+        """Delete an expense (the alloc_spent triggers update its allocation)
+        
+        category and amount are accepted for compatibility; the stored row is
+        used instead. Without user_id the expense is looked up by id alone.
+        """
         try:
-            cursor = self.conn.cursor()
-            
-            # First get the expense date to know which allocation to update
-            self._execute(cursor, 'SELECT date FROM expenses WHERE id = ? AND user_id = ?', (expense_id, user_id))
-            expense = cursor.fetchone()
-            
-            if not expense:
-                print(f"Expense {expense_id} not found")
-                return False
-            
-            # Extract year/month from expense date
-            try:
-                expense_date = expense['date']
-                year, month = int(expense_date[:4]), int(expense_date[5:7])
+            with self._tx() as (cursor, commit):
+                if user_id is None:
+                    cursor = self._execute(cursor, 'DELETE FROM expenses WHERE id = ?', (expense_id,))
+                else:
+                    cursor = self._execute(cursor, 'DELETE FROM expenses WHERE id = ? AND user_id = ?', (expense_id, user_id))
                 
-                self._execute(cursor,
-                    'SELECT allocated_amount, spent_amount FROM allocations WHERE user_id = ? AND category = ? AND year = ? AND month = ?',
-                    (user_id, category, year, month)
-                )
-                row = cursor.fetchone()
-                if row:
-                    allocated = float(row['allocated_amount'])
-                    spent = float(row['spent_amount'])
-                    new_spent = spent - float(amount)
-                    new_balance = allocated - new_spent
-                    self._execute(cursor,
-                        'UPDATE allocations SET spent_amount = ?, balance = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ? AND category = ? AND year = ? AND month = ?',
-                        (new_spent, new_balance, user_id, category, year, month)
-                    )
-            except (ValueError, IndexError) as e:
-                print(f"Warning: Could not extract year/month from expense date: {e}")
-            
-            self._execute(cursor, 'DELETE FROM expenses WHERE id = ? AND user_id = ?', (expense_id, user_id))
-            
-            self.conn.commit()
-            return True
+                if cursor.rowcount == 0:
+                    logger.warning("Expense %s not found", expense_id)
+                    return False
+                
+                commit()
+                self._bump_version('expenses', 'allocations')
+                return True
         except Exception as e:
-            print(f"Error deleting expense: {str(e)}")
-            self.conn.rollback()
+            logger.error("Error deleting expense: %s", e)
             return False
     
     # ==================== ADMIN ANALYTICS (HOUSEHOLD-WIDE) ====================
     
     def get_household_total_income(self, household_id):
-        """Get total income for entire household"""
+        """Get total income for entire household (cached until income is written)"""
         try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, '''
+            total = self._cached_total('income', ('household', household_id), lambda: self._fetch_total('''
                 SELECT SUM(i.amount) as total
                 FROM income i
                 JOIN users u ON i.user_id = u.id
                 WHERE u.household_id = ?
-            ''', (household_id,))
-            result = cursor.fetchone()
-            return result['total'] if result['total'] else 0
+            ''', (household_id,)))
+            return total if total else 0
         except Exception as e:
-            print(f"Error calculating household income: {str(e)}")
+            logger.error("Error calculating household income: %s", e)
             return 0
     
     def get_household_total_expenses(self, household_id):
-        """Get total expenses for entire household"""
+        """Get total expenses for entire household (cached until expenses are written)"""
         try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, '''
+            total = self._cached_total('expenses', ('household', household_id), lambda: self._fetch_total('''
                 SELECT SUM(e.amount) as total
                 FROM expenses e
                 JOIN users u ON e.user_id = u.id
                 WHERE u.household_id = ?
-            ''', (household_id,))
-            result = cursor.fetchone()
-            return result['total'] if result['total'] else 0
+            ''', (household_id,)))
+            return total if total else 0
         except Exception as e:
-            print(f"Error calculating household expenses: {str(e)}")
+            logger.error("Error calculating household expenses: %s", e)
             return 0
     
+    def get_household_totals(self, household_id):
+        """Get household income, expenses and savings totals in one round-trip"""
+        def load():
+            with closing(self.conn.cursor()) as cursor:
+                self._execute(cursor, '''
+                    SELECT
+                        (SELECT COALESCE(SUM(i.amount), 0) FROM income i
+                         JOIN users u ON i.user_id = u.id WHERE u.household_id = ?) as income,
+                        (SELECT COALESCE(SUM(e.amount), 0) FROM expenses e
+                         JOIN users u ON e.user_id = u.id WHERE u.household_id = ?) as expenses,
+                        (SELECT COALESCE(SUM(s.amount), 0) FROM savings s
+                         JOIN users u ON s.user_id = u.id WHERE u.household_id = ?) as savings
+                ''', (household_id, household_id, household_id))
+                row = self._row_dict(cursor.fetchone())
+                return {name: float(row[name]) for name in ('income', 'expenses', 'savings')}
+        
+        try:
+            # Filed under income, with the other two tables' versions in the key so any write invalidates it
+            key = ('household_totals', household_id, self._ver['expenses'], self._ver['savings'])
+            return dict(self._cached_total('income', key, load))
+        except Exception as e:
+            logger.error("Error calculating household totals: %s", e)
+            return {'income': 0, 'expenses': 0, 'savings': 0}
+    
     def get_household_member_summary(self, household_id):
         """Get member-wise financial summary"""
         try:
-            # Use appropriate parameter placeholder
-            param_placeholder = '%s' if self.use_postgres else '?'
-            query = f'''
+            # Total income and expenses separately per member: joining both tables at once
+            # would multiply each income row by every expense row of the same user
+            df = self._fetch_frame('''
                 SELECT 
-                    u.full_name as Member,
-                    COALESCE(SUM(i.amount), 0) as Income,
-                    COALESCE(SUM(e.amount), 0) as Expenses,
-                    COALESCE(SUM(i.amount), 0) - COALESCE(SUM(e.amount), 0) as Savings
-                FROM users u
-                LEFT JOIN income i ON u.id = i.user_id
-                LEFT JOIN expenses e ON u.id = e.user_id
-                WHERE u.household_id = {param_placeholder}
-                GROUP BY u.id, u.full_name
-                ORDER BY u.full_name
-            '''
-            # Use engine for pandas queries if PostgreSQL
-            conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            df = pd.read_sql_query(query, conn_to_use, params=(household_id,))
-            print(f"DEBUG: get_household_member_summary returned {len(df)} rows for household {household_id}")
+                    full_name as Member,
+                    income_total as Income,
+                    expense_total as Expenses,
+                    income_total - expense_total as Savings
+                FROM (
+                    SELECT u.full_name,
+                           (SELECT COALESCE(SUM(i.amount), 0) FROM income i WHERE i.user_id = u.id) as income_total,
+                           (SELECT COALESCE(SUM(e.amount), 0) FROM expenses e WHERE e.user_id = u.id) as expense_total
+                    FROM users u
+                    WHERE u.household_id = ?
+                ) totals
+                ORDER BY full_name
+            ''', (household_id,))
+            logger.debug("get_household_member_summary returned %d rows for household %s", len(df), household_id)
             return df
-        except Exception as e:
-            print(f"Error getting member summary: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error getting member summary")
             return pd.DataFrame()
     
     
+    def _chatbot_connection(self):
+        """Return the read-only connection chatbot queries run on, opening it on first use"""
+        # Kept apart from self.conn so chatbot queries never touch its pending transaction or settings
+        if self._chatbot_conn is not None and not (self.use_postgres and self._chatbot_conn.closed):
+            return self._chatbot_conn
+        
+        if self.use_postgres:
+            conn = self._open_postgres()
+            conn.set_session(readonly=True)
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'")
+                tables = {row['table_name'] for row in cursor.fetchall()}
+            conn.rollback()
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            conn.execute('PRAGMA query_only = ON')
+            # Checked by SQLite per table/column while each statement compiles
+            conn.set_authorizer(_chatbot_authorizer)
+        
+        self._chatbot_tables = tuple(table for table in CHATBOT_USER_TABLES if table in tables)
+        self._chatbot_conn = conn
+        return conn
+    
+    def _chatbot_scope(self, user_id, family_id, role):
+        """Return CTEs that shadow each table with the rows the caller may see, or None for super admins"""
+        if role in ('superadmin', 'super'):
+            return None
+        
+        # Inlined as integers so the query's own % and ? characters never meet a paramstyle
+        schema = 'public' if self.use_postgres else 'main'
+        user_id, family_id = int(user_id), int(family_id)
+        if role == 'admin':
+            users_filter = f'household_id = {family_id}'
+            owned_filter = f'user_id IN (SELECT id FROM {schema}.users WHERE household_id = {family_id})'
+        else:
+            users_filter = f'id = {user_id}'
+            owned_filter = f'user_id = {user_id}'
+        
+        ctes = [f'households AS (SELECT * FROM {schema}.households WHERE id = {family_id})',
+                f'users AS (SELECT {CHATBOT_USER_COLUMNS} FROM {schema}.users WHERE {users_filter})']
+        ctes += [f'{table} AS (SELECT * FROM {schema}.{table} WHERE {owned_filter})' for table in self._chatbot_tables]
+        return ', '.join(ctes)
+    
     def execute_chatbot_query(self, sql_query: str, user_id: int, family_id: int, role: str):
         """
         Execute a safe, read-only query for the chatbot
@@ -1732,238 +2463,181 @@ class MultiUserDB:
             List of result rows or error message
         """
         try:
-            # Security validations
-            sql_upper = sql_query.upper().strip()
-            
-            # Must be SELECT only
-            if not sql_upper.startswith("SELECT"):
+            # Security validations: exactly one statement, and it must be a SELECT
+            # (tokenized, so comments and string literals can't hide or fake keywords)
+            statements = [stmt for stmt in sqlparse.parse(sql_query) if stmt.token_first(skip_cm=True) is not None]
+            if len(statements) != 1 or statements[0].get_type() != 'SELECT':
                 return {"error": "Only SELECT queries are allowed"}
             
-            # Block dangerous keywords
-            dangerous_keywords = ["DROP", "DELETE", "UPDATE", "INSERT", "ALTER", "CREATE", "TRUNCATE", "EXECUTE", "--"]
-            if any(keyword in sql_upper for keyword in dangerous_keywords):
-                return {"error": "Query contains forbidden operations"}
-            
-            # Execute query
-            self._ensure_connection()
-            cursor = self.conn.cursor()
-            cursor.execute(sql_query)
+            tokens = [token for token in statements[0].flatten()
+                      if not token.is_whitespace and token.ttype not in sqlparse.tokens.Comment]
+            for token, following in zip(tokens, tokens[1:]):
+                if (token.ttype not in sqlparse.tokens.String.Single and following.value == '.'
+                        and token.value.strip('"`[]').lower() in CHATBOT_SCHEMAS):
+                    return {"error": "Schema-qualified table names are not allowed"}
+            
+            if self.db_path == ':memory:' and not self.use_postgres:
+                return {"error": "Chatbot queries need an on-disk database"}
+            conn = self._chatbot_connection()
+            
+            # Scope every table to the caller's household (or to the member themselves)
+            # by prepending CTEs that shadow the real tables
+            scope = self._chatbot_scope(user_id, family_id, role)
+            if scope:
+                statement = statements[0]
+                first = statement.token_first(skip_cm=True)
+                if first.ttype is sqlparse.tokens.Keyword.CTE:
+                    # Merge into the query's own WITH (keeping RECURSIVE, which covers the whole list)
+                    rest = ''.join(str(token) for token in statement.tokens[statement.token_index(first) + 1:]).lstrip()
+                    recursive = rest[:9].upper() == 'RECURSIVE' and not rest[9:10].isalnum()
+                    if recursive:
+                        rest = rest[9:].lstrip()
+                    sql_query = f"WITH {'RECURSIVE ' if recursive else ''}{scope}, {rest}"
+                else:
+                    sql_query = f'WITH {scope} {statement}'
             
-            # Fetch results
-            results = cursor.fetchall()
+            # The chatbot connection is read-only, so the database itself rejects writes
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql_query)
+                
+                # Fetch results
+                results = cursor.fetchall()
+            finally:
+                cursor.close()
+                if self.use_postgres:
+                    conn.rollback()
             
-            # Convert to list of dicts
-            if self.use_postgres:
-                # RealDictCursor already returns dicts
-                return [dict(row) for row in results]
-            else:
-                # SQLite Row factory
-                return [dict(row) for row in results]
+            # Convert to list of dicts (RealDictCursor rows and sqlite3.Row both support dict())
+            return [dict(row) for row in results]
                 
         except Exception as e:
-            print(f"❌ Chatbot query error: {e}")
+            logger.error("Chatbot query error: %s", e)
             return {"error": f"Query execution failed: {str(e)}"}
     
     # ==================== SAVINGS MANAGEMENT ====================
     
     def add_saving(self, user_id, date, category, amount, notes):
-        """Add a new saving entry"""
+        """Add a new saving entry, returning its id"""
         try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, '''
-                INSERT INTO savings (user_id, date, category, amount, notes)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, date, category, amount, notes))
-            self.conn.commit()
-            return True
+            with self._tx() as (cursor, commit):
+                saving_id = self._insert_returning_id(cursor, SQL_INSERT_SAVING, (user_id, date, category, amount, notes))
+                commit()
+                self._bump_version('savings')
+                return saving_id
         except Exception as e:
-            print(f"Error adding saving: {str(e)}")
-            self.conn.rollback()
+            logger.error("Error adding saving: %s", e)
+            return False
+    
+    def add_savings_batch(self, user_id, savings):
+        """
+        Add several saving entries in one transaction
+        savings: list of dicts with date, category, amount and optional notes
+        Returns the new saving ids, or False on error
+        """
+        try:
+            rows = [(user_id, s['date'], s['category'], s['amount'], s.get('notes')) for s in savings]
+            with self._tx() as (cursor, commit):
+                saving_ids = self._bulk_insert(cursor, 'savings', SAVING_COLUMNS, rows, return_ids=True)
+                commit()
+                self._bump_version('savings')
+                return saving_ids
+        except Exception as e:
+            logger.error("Error adding savings: %s", e)
             return False
     
     def get_all_savings(self, user_id, year=None, month=None):
         """Get all savings for a user, optionally filtered by period"""
         try:
-            param_placeholder = '%s' if self.use_postgres else '?'
-            
             if year and month:
                 # Filter by specific month
-                query = f'''
-                    SELECT date, category, amount, notes
-                    FROM savings
-                    WHERE user_id = {param_placeholder}
-                    AND strftime('%Y', date) = {param_placeholder}
-                    AND strftime('%m', date) = {param_placeholder}
-                    ORDER BY date DESC
-                '''
-                params = (user_id, str(year), f'{month:02d}')
+                query = self._sql['get_all_savings_period']
+                params = (user_id, *_month_bounds(year, month))
             else:
                 # Get all savings
-                query = f'''
-                    SELECT date, category, amount, notes
-                    FROM savings
-                    WHERE user_id = {param_placeholder}
-                    ORDER BY date DESC
-                '''
+                query = self._sql['get_all_savings']
                 params = (user_id,)
             
             conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            df = pd.read_sql_query(query, conn_to_use, params=params)
-            
-            # Format columns for display
-            if not df.empty:
-                df['Date'] = df['date']
-                df['Category'] = df['category']
-                df['Amount'] = df['amount'].apply(lambda x: float(x))
-                df['Notes'] = df['notes'].fillna('')
-                df = df[['Date', 'Category', 'Amount', 'Notes']]
+            df = self._read_sql_chunked(query, conn_to_use, params)
             
+            # Format columns for display in one rename (amounts are already floats from the Arrow reader)
+            df = df.rename(columns={'date': 'Date', 'category': 'Category', 'amount': 'Amount', 'notes': 'Notes'})
+            df['Notes'] = df['Notes'].fillna('')
             return df
-        except Exception as e:
-            print(f"Error fetching savings: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error fetching savings")
             return pd.DataFrame()
     
     def get_savings_with_ids(self, user_id, year=None, month=None):
         """Get savings with IDs for editing"""
         try:
-            param_placeholder = '%s' if self.use_postgres else '?'
-            
             if year and month:
-                query = f'''
-                    SELECT id, date, category, amount, notes
-                    FROM savings
-                    WHERE user_id = {param_placeholder}
-                    AND strftime('%Y', date) = {param_placeholder}
-                    AND strftime('%m', date) = {param_placeholder}
-                    ORDER BY date DESC
-                '''
-                params = (user_id, str(year), f'{month:02d}')
+                query = self._sql['get_savings_with_ids_period']
+                params = (user_id, *_month_bounds(year, month))
             else:
-                query = f'''
-                    SELECT id, date, category, amount, notes
-                    FROM savings
-                    WHERE user_id = {param_placeholder}
-                    ORDER BY date DESC
-                '''
+                query = self._sql['get_savings_with_ids']
                 params = (user_id,)
             
             conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
-            df = pd.read_sql_query(query, conn_to_use, params=params)
+            df = self._read_sql_chunked(query, conn_to_use, params)
             return df
         except Exception as e:
-            print(f"Error fetching savings with IDs: {str(e)}")
+            logger.error("Error fetching savings with IDs: %s", e)
             return pd.DataFrame()
     
     def update_saving(self, saving_id, date, category, amount, notes):
         """Update an existing saving entry"""
         try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, '''
-                UPDATE savings
-                SET date = ?, category = ?, amount = ?, notes = ?
-                WHERE id = ?
-            ''', (date, category, amount, notes, saving_id))
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error updating saving: {str(e)}")
-            self.conn.rollback()
+            with self._tx() as (cursor, commit):
+                self._execute(cursor, '''
+                    UPDATE savings
+                    SET date = ?, category = ?, amount = ?, notes = ?
+                    WHERE id = ?
+                ''', (date, category, amount, notes, saving_id))
+                commit()
+                self._bump_version('savings')
+                return True
+        except Exception as e:
+            logger.error("Error updating saving: %s", e)
             return False
     
     def delete_saving(self, saving_id):
         """Delete a saving entry"""
         try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, 'DELETE FROM savings WHERE id = ?', (saving_id,))
-            self.conn.commit()
-            return True
+            with self._tx() as (cursor, commit):
+                self._execute(cursor, 'DELETE FROM savings WHERE id = ?', (saving_id,))
+                commit()
+                self._bump_version('savings')
+                return True
         except Exception as e:
-            print(f"Error deleting saving: {str(e)}")
-            self.conn.rollback()
+            logger.error("Error deleting saving: %s", e)
             return False
     
     def get_total_savings(self, user_id, year=None, month=None):
         """Get total savings amount for a user, optionally filtered by period"""
         try:
-            cursor = self.conn.cursor()
-            param_placeholder = '%s' if self.use_postgres else '?'
-            
             if year and month:
-                query = f'''
-                    SELECT SUM(amount) as total
-                    FROM savings
-                    WHERE user_id = {param_placeholder}
-                    AND strftime('%Y', date) = {param_placeholder}
-                    AND strftime('%m', date) = {param_placeholder}
-                '''
-                self._execute(cursor, query, (user_id, str(year), f'{month:02d}'))
+                query = self._sql['get_total_savings_period']
+                params = (user_id, *_month_bounds(year, month))
             else:
-                query = f'''
-                    SELECT SUM(amount) as total
-                    FROM savings
-                    WHERE user_id = {param_placeholder}
-                '''
-                self._execute(cursor, query, (user_id,))
+                query = self._sql['get_total_savings']
+                params = (user_id,)
             
-            result = cursor.fetchone()
-            return float(result['total']) if result and result['total'] else 0.0
+            return float(self._cached_total('savings', params, lambda: self._fetch_total(query, params)))
         except Exception as e:
-            print(f"Error calculating total savings: {str(e)}")
+            logger.error("Error calculating total savings: %s", e)
             return 0.0
     
-    # ==================== INCOME MANAGEMENT (Mobile API Support) ====================
-    
-    def add_income(self, user_id, date, source, amount):
-        """Add a new income entry"""
-        try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, '''
-                INSERT INTO income (user_id, date, source, amount)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, date, source, amount))
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error adding income: {str(e)}")
-            self.conn.rollback()
-            return False
-    
-    
-    # ==================== EXPENSE MANAGEMENT (Mobile API Support) ====================
-    
-    def add_expense(self, user_id, date, category, amount, comment=None, subcategory=None, payment_mode=None, payment_details=None):
-        """Add a new expense entry"""
-        try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, '''
-                INSERT INTO expenses (user_id, date, category, subcategory, amount, comment, payment_mode, payment_details)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, date, category, subcategory, amount, comment, payment_mode, payment_details))
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error adding expense: {str(e)}")
-            self.conn.rollback()
-            return False
-    
-    def delete_expense(self, expense_id, user_id=None, category=None, amount=None):
-        """Delete an expense entry (supports both old and new signatures)"""
-        try:
-            cursor = self.conn.cursor()
-            self._execute(cursor, 'DELETE FROM expenses WHERE id = ?', (expense_id,))
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error deleting expense: {str(e)}")
-            self.conn.rollback()
-            return False
-    
     def close(self):
         """Close database connection"""
         if self.conn:
             self.conn.close()
+        if self._chatbot_conn is not None:
+            self._chatbot_conn.close()
+        if self._engine:
+            # Release the pooled pandas connections as well
+            self._engine.dispose()
 
     def get_available_allocation_periods(self, user_id):
         """Get all periods where allocations exist for a user"""
@@ -1977,11 +2651,9 @@ class MultiUserDB:
             ''', (user_id,))
             
             periods = cursor.fetchall()
-            return [{'year': p['year'] if isinstance(p, dict) else p[0], 
-                    'month': p['month'] if isinstance(p, dict) else p[1]} 
-                   for p in periods]
+            return [{'year': p['year'], 'month': p['month']} for p in periods]
         except Exception as e:
-            print(f"Error getting allocation periods: {str(e)}")
+            logger.error("Error getting allocation periods: %s", e)
             return []
     
     def copy_allocations_from_period(self, user_id, from_year, from_month, to_year, to_month):
@@ -1989,15 +2661,21 @@ class MultiUserDB:
         try:
             cursor = self.conn.cursor()
             
+            if not self.use_postgres and not self.conn.in_transaction:
+                # Take the write lock up front so the check, read and insert below
+                # run as one SQLite transaction with a single commit
+                cursor.execute('BEGIN IMMEDIATE')
+            
             # First check if target period already has allocations
             self._execute(cursor, '''
                 SELECT COUNT(*) as count FROM allocations 
                 WHERE user_id = ? AND year = ? AND month = ?
             ''', (user_id, to_year, to_month))
             result = cursor.fetchone()
-            existing_count = result['count'] if isinstance(result, dict) else result[0]
+            existing_count = result['count']
             
             if existing_count > 0:
+                self.conn.rollback()
                 return (False, f"Target period {to_year}-{to_month} already has {existing_count} allocations")
             
             # Get source allocations
@@ -2010,22 +2688,22 @@ class MultiUserDB:
             source_allocations = cursor.fetchall()
             
             if not source_allocations:
+                self.conn.rollback()
                 return (False, f"No allocations found for {from_year}-{from_month}")
             
-            # Copy to target period
-            for allocation in source_allocations:
-                category = allocation['category'] if isinstance(allocation, dict) else allocation[0]
-                amount = allocation['allocated_amount'] if isinstance(allocation, dict) else allocation[1]
-                
-                self._execute(cursor, '''
-                    INSERT INTO allocations (user_id, category, allocated_amount, spent_amount, balance, year, month)
-                    VALUES (?, ?, ?, 0, ?, ?, ?)
-                ''', (user_id, category, amount, amount, to_year, to_month))
+            # Copy to target period in a single batched insert
+            rows = [(user_id, a['category'], a['allocated_amount'], 0, a['allocated_amount'], to_year, to_month)
+                    for a in source_allocations]
+            
+            self._bulk_insert(cursor, 'allocations',
+                              ('user_id', 'category', 'allocated_amount', 'spent_amount', 'balance', 'year', 'month'),
+                              rows)
             
             self.conn.commit()
+            self._bump_version('allocations')
             return (True, f"Copied {len(source_allocations)} allocations from {from_year}-{from_month} to {to_year}-{to_month}")
         except Exception as e:
-            print(f"Error copying allocations: {str(e)}")
+            logger.error("Error copying allocations: %s", e)
             self.conn.rollback()
             return (False, str(e))
 
@@ -2035,334 +2713,188 @@ class MultiUserDB:
         try:
             cursor = self.conn.cursor()
             
-            # Use database-specific date extraction
-            if self.use_postgres:
-                # PostgreSQL syntax
-                if is_admin:
-                    self._execute(cursor, '''
-                        SELECT DISTINCT EXTRACT(YEAR FROM i.date::date)::integer as year
-                        FROM income i JOIN users u ON i.user_id = u.id
-                        WHERE u.household_id = %s ORDER BY year DESC
-                    ''', (household_id,))
-                else:
-                    self._execute(cursor, '''
-                        SELECT DISTINCT EXTRACT(YEAR FROM date::date)::integer as year
-                        FROM income WHERE user_id = %s ORDER BY year DESC
-                    ''', (user_id,))
+            # income.year is a generated column, so both dialects read it from the
+            # (user_id, year, month) index instead of parsing every date
+            if is_admin:
+                self._execute(cursor, '''
+                    SELECT DISTINCT i.year
+                    FROM income i JOIN users u ON i.user_id = u.id
+                    WHERE u.household_id = ? ORDER BY i.year DESC
+                ''', (household_id,))
             else:
-                # SQLite syntax
-                if is_admin:
-                    self._execute(cursor, '''
-                        SELECT DISTINCT CAST(strftime('%Y', i.date) as INTEGER) as year
-                        FROM income i JOIN users u ON i.user_id = u.id
-                        WHERE u.household_id = ? ORDER BY year DESC
-                    ''', (household_id,))
-                else:
-                    self._execute(cursor, '''
-                        SELECT DISTINCT CAST(strftime('%Y', date) as INTEGER) as year
-                        FROM income WHERE user_id = ? ORDER BY year DESC
-                    ''', (user_id,))
+                self._execute(cursor, '''
+                    SELECT DISTINCT year
+                    FROM income WHERE user_id = ? ORDER BY year DESC
+                ''', (user_id,))
             
-            years = [int(row['year']) if isinstance(row, dict) else int(row[0]) for row in cursor.fetchall()]
+            years = [int(row['year']) for row in cursor.fetchall()]
             return years
-        except Exception as e:
-            print(f"Error getting savings years: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error getting savings years")
             return []
     
     def get_monthly_liquidity_by_member(self, household_id, year, is_admin, user_id=None):
-        """Get monthly liquidity (Income - Allocations) grouped by member"""
+        """Get monthly liquidity (Income - Allocations) for months with income, grouped by member"""
         try:
-            cursor = self.conn.cursor()
+            conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
             
             if is_admin:
                 # For admin - get all household members' liquidity
-                self._execute(cursor, '''
-                    SELECT 
-                        EXTRACT(MONTH FROM i.date::date)::integer as month,
-                        u.full_name as member,
-                        COALESCE(SUM(i.amount::numeric), 0) as total_income,
-                        COALESCE((
-                            SELECT SUM(a.allocated_amount::numeric)
-                            FROM allocations a 
-                            WHERE a.user_id = u.id
-                              AND a.year = %s
-                              AND a.month = EXTRACT(MONTH FROM i.date::date)::integer
-                        ), 0) as total_allocated
-                    FROM income i 
-                    JOIN users u ON i.user_id = u.id
-                    WHERE u.household_id = %s 
-                      AND EXTRACT(YEAR FROM i.date::date)::integer = %s
-                    GROUP BY EXTRACT(MONTH FROM i.date::date)::integer, u.full_name, u.id
-                    ORDER BY month, u.full_name
-                ''', (year, household_id, year))
+                df = pd.read_sql_query(f'''
+                    SELECT ml.month, u.full_name as member, ml.income - ml.allocated as liquidity
+                    FROM monthly_liquidity ml
+                    JOIN users u ON ml.user_id = u.id
+                    WHERE u.household_id = {self._ph} AND ml.year = {self._ph} AND ml.income_rows > 0
+                    ORDER BY ml.month, u.full_name
+                ''', conn_to_use, params=(household_id, year))
             else:
                 # For member - get just their liquidity
-                self._execute(cursor, '''
-                    SELECT 
-                        EXTRACT(MONTH FROM i.date::date)::integer as month,
-                        COALESCE(SUM(i.amount::numeric), 0) as total_income,
-                        COALESCE((
-                            SELECT SUM(a.allocated_amount::numeric)
-                            FROM allocations a 
-                            WHERE a.user_id = %s
-                              AND a.year = %s
-                              AND a.month = EXTRACT(MONTH FROM i.date::date)::integer
-                        ), 0) as total_allocated
-                    FROM income i
-                    WHERE i.user_id = %s 
-                      AND EXTRACT(YEAR FROM i.date::date)::integer = %s
-                    GROUP BY EXTRACT(MONTH FROM i.date::date)::integer
+                df = pd.read_sql_query(f'''
+                    SELECT month, income - allocated as liquidity
+                    FROM monthly_liquidity
+                    WHERE user_id = {self._ph} AND year = {self._ph} AND income_rows > 0
                     ORDER BY month
-                ''', (user_id, year, user_id, year))
-            
-            results = cursor.fetchall()
-            data = []
-            for row in results:
-                if is_admin:
-                    month = row['month'] if isinstance(row, dict) else row[0]
-                    member = row['member'] if isinstance(row, dict) else row[1]
-                    total_income = row['total_income'] if isinstance(row, dict) else row[2]
-                    total_allocated = row['total_allocated'] if isinstance(row, dict) else row[3]
-                    liquidity = total_income - total_allocated
-                    data.append({'month': month, 'member': member, 'liquidity': liquidity})
-                else:
-                    month = row['month'] if isinstance(row, dict) else row[0]
-                    total_income = row['total_income'] if isinstance(row, dict) else row[1]
-                    total_allocated = row['total_allocated'] if isinstance(row, dict) else row[2]
-                    liquidity = total_income - total_allocated
-                    data.append({'month': month, 'liquidity': liquidity})
-            
-            return pd.DataFrame(data)
-        except Exception as e:
-            print(f"Error getting monthly liquidity: {str(e)}")
-            return pd.DataFrame()
-    def get_monthly_liquidity_by_member(self, household_id, year, is_admin, user_id=None):
-        """Get monthly liquidity (Income - Allocations) grouped by member"""
-        try:
-            cursor = self.conn.cursor()
+                ''', conn_to_use, params=(user_id, year))
             
-            if is_admin:
-                self._execute(cursor, '''
-                    SELECT 
-                        CAST(strftime('%m', i.date) as INTEGER) as month,
-                        u.full_name as member,
-                        COALESCE(SUM(CAST(i.amount as REAL)), 0) as total_income,
-                        COALESCE((SELECT SUM(CAST(a.allocated_amount as REAL))
-                             FROM allocations a WHERE a.user_id = u.id
-                             AND a.year = ? AND a.month = CAST(strftime('%m', i.date) as INTEGER)), 0) as total_allocated
-                    FROM income i JOIN users u ON i.user_id = u.id
-                    WHERE u.household_id = ? AND CAST(strftime('%Y', i.date) as INTEGER) = ?
-                    GROUP BY CAST(strftime('%m', i.date) as INTEGER), u.full_name, u.id
-                    ORDER BY month, u.full_name
-                ''', (year, household_id, year))
-            else:
-                self._execute(cursor, '''
-                    SELECT 
-                        CAST(strftime('%m', i.date) as INTEGER) as month,
-                        COALESCE(SUM(CAST(i.amount as REAL)), 0) as total_income,
-                        COALESCE((SELECT SUM(CAST(a.allocated_amount as REAL))
-                             FROM allocations a WHERE a.user_id = ?
-                             AND a.year = ? AND a.month = CAST(strftime('%m', i.date) as INTEGER)), 0) as total_allocated
-                    FROM income i
-                    WHERE user_id = ? AND CAST(strftime('%Y', i.date) as INTEGER) = ?
-                    GROUP BY CAST(strftime('%m', i.date) as INTEGER)
-                    ORDER BY month
-                ''', (user_id, year, user_id, year))
-            
-            results = cursor.fetchall()
-            data = []
-            for row in results:
-                if is_admin:
-                    month = row['month'] if isinstance(row, dict) else row[0]
-                    member = row['member'] if isinstance(row, dict) else row[1]
-                    total_income = row['total_income'] if isinstance(row, dict) else row[2]
-                    total_allocated = row['total_allocated'] if isinstance(row, dict) else row[3]
-                    liquidity = total_income - total_allocated
-                    data.append({'month': month, 'member': member, 'liquidity': liquidity})
-                else:
-                    month = row['month'] if isinstance(row, dict) else row[0]
-                    total_income = row['total_income'] if isinstance(row, dict) else row[1]
-                    total_allocated = row['total_allocated'] if isinstance(row, dict) else row[2]
-                    liquidity = total_income - total_allocated
-                    data.append({'month': month, 'liquidity': liquidity})
-            
-            return pd.DataFrame(data)
+            # PostgreSQL NUMERIC results arrive as Decimal objects
+            df['liquidity'] = df['liquidity'].astype('float64')
+            return df
         except Exception as e:
-            print(f"Error getting monthly liquidity: {str(e)}")
+            logger.error("Error getting monthly liquidity: %s", e)
             return pd.DataFrame()
+    
     def get_monthly_liquidity_by_member_simple(self, household_id, year, is_admin, user_id=None):
         """Get monthly liquidity - simplified version that works reliably"""
+        return self._cached_liquidity((household_id, year, user_id, is_admin),
+                                      lambda: self._query_monthly_liquidity(household_id, year, is_admin, user_id))
+    
+    def _liquidity_sql(self, is_admin, owner_ph, year_ph):
+        """Build the liquidity lookup with the given owner/year placeholders"""
+        if is_admin:
+            owner_filter = f'user_id IN (SELECT id FROM users WHERE household_id = {owner_ph})'
+        else:
+            owner_filter = f'user_id = {owner_ph}'
+        
+        # monthly_liquidity is kept current by triggers on income and allocations
+        return f'''
+            SELECT ml.month, u.full_name as member, ml.income - ml.allocated as liquidity
+            FROM monthly_liquidity ml
+            JOIN users u ON u.id = ml.user_id
+            WHERE ml.{owner_filter} AND ml.year = {year_ph}
+              AND (ml.income_rows > 0 OR ml.alloc_rows > 0)
+        '''
+    
+    def _query_monthly_liquidity(self, household_id, year, is_admin, user_id):
+        """Run the liquidity query for get_monthly_liquidity_by_member_simple"""
         try:
-            cursor = self.conn.cursor()
+            owner = household_id if is_admin else user_id
             
-            # Get income data with database-specific syntax
             if self.use_postgres:
-                # PostgreSQL syntax
-                if is_admin:
-                    self._execute(cursor, '''
-                        SELECT u.full_name as member, u.id as user_id,
-                               EXTRACT(MONTH FROM i.date::date)::integer as month,
-                               SUM(i.amount::numeric) as total_income
-                        FROM income i
-                        JOIN users u ON i.user_id = u.id
-                        WHERE u.household_id = %s
-                          AND EXTRACT(YEAR FROM i.date::date)::integer = %s
-                        GROUP BY u.full_name, u.id, EXTRACT(MONTH FROM i.date::date)::integer
-                    ''', (household_id, year))
-                else:
-                    self._execute(cursor, '''
-                        SELECT EXTRACT(MONTH FROM date::date)::integer as month,
-                               SUM(amount::numeric) as total_income
-                        FROM income
-                        WHERE user_id = %s
-                          AND EXTRACT(YEAR FROM date::date)::integer = %s
-                        GROUP BY EXTRACT(MONTH FROM date::date)::integer
-                    ''', (user_id, year))
+                # One cursor for the PREPAREs and the EXECUTE, closed once the rows are read
+                statement = 'liq_household' if is_admin else 'liq_member'
+                with self.conn.cursor() as cursor:
+                    self._prepare_statement(cursor, statement)
+                    cursor = self._execute(cursor, f'EXECUTE {statement}(?, ?)', (owner, year))
+                    df = pd.DataFrame(cursor.fetchall(), columns=['month', 'member', 'liquidity'])
             else:
-                # SQLite syntax
-                if is_admin:
-                    self._execute(cursor, '''
-                        SELECT u.full_name as member, u.id as user_id,
-                               CAST(strftime('%m', i.date) as INTEGER) as month,
-                               SUM(CAST(i.amount as REAL)) as total_income
-                        FROM income i
-                        JOIN users u ON i.user_id = u.id
-                        WHERE u.household_id = ?
-                          AND CAST(strftime('%Y', i.date) as INTEGER) = ?
-                        GROUP BY u.full_name, u.id, CAST(strftime('%m', i.date) as INTEGER)
-                    ''', (household_id, year))
-                else:
-                    self._execute(cursor, '''
-                        SELECT CAST(strftime('%m', date) as INTEGER) as month,
-                               SUM(CAST(amount as REAL)) as total_income
-                        FROM income
-                        WHERE user_id = ?
-                          AND CAST(strftime('%Y', date) as INTEGER) = ?
-                        GROUP BY CAST(strftime('%m', date) as INTEGER)
-                    ''', (user_id, year))
-            
-            income_rows = cursor.fetchall()
-            
-            # Get allocation data with database-specific syntax
-            if self.use_postgres:
-                # PostgreSQL syntax
-                if is_admin:
-                    self._execute(cursor, '''
-                        SELECT u.full_name as member, u.id as user_id, a.month,
-                               SUM(a.allocated_amount::numeric) as total_allocated
-                        FROM allocations a
-                        JOIN users u ON a.user_id = u.id
-                        WHERE u.household_id = %s AND a.year = %s
-                        GROUP BY u.full_name, u.id, a.month
-                    ''', (household_id, year))
-                else:
-                    self._execute(cursor, '''
-                        SELECT month, SUM(allocated_amount::numeric) as total_allocated
-                        FROM allocations
-                        WHERE user_id = %s AND year = %s
-                        GROUP BY month
-                    ''', (user_id, year))
-            else:
-                # SQLite syntax
-                if is_admin:
-                    self._execute(cursor, '''
-                        SELECT u.full_name as member, u.id as user_id, a.month,
-                               SUM(CAST(a.allocated_amount as REAL)) as total_allocated
-                        FROM allocations a
-                        JOIN users u ON a.user_id = u.id
-                        WHERE u.household_id = ? AND a.year = ?
-                        GROUP BY u.full_name, u.id, a.month
-                    ''', (household_id, year))
-                else:
-                    self._execute(cursor, '''
-                        SELECT month, SUM(CAST(allocated_amount as REAL)) as total_allocated
-                        FROM allocations
-                        WHERE user_id = ? AND year = ?
-                        GROUP BY month
-                    ''', (user_id, year))
-            
-            alloc_rows = cursor.fetchall()
-            
-            # Build data structure
-            data = []
+                df = pd.read_sql_query(self._liquidity_sql(is_admin, '?', '?'), self.conn, params=(owner, year))
             
+            df['month'] = df['month'].astype(int)
+            df['liquidity'] = df['liquidity'].astype(float)
+            return df if is_admin else df[['month', 'liquidity']]
+        except Exception:
+            logger.exception("Error in get_monthly_liquidity_by_member_simple")
+            return pd.DataFrame()
+    
+    def prefetch_liquidity(self, household_id, user_id, is_admin, years=None):
+        """Warm the liquidity cache for a household's recent years with a single query after login"""
+        if years is None:
+            current_year = datetime.now().year
+            years = [current_year, current_year - 1]
+        years = list(years)
+        if not years:
+            return
+        
+        try:
+            conn_to_use = self.engine if (self.use_postgres and self.engine) else self.conn
+            year_list = ', '.join([self._ph] * len(years))
             if is_admin:
-                # Create dict of {(member, month): income}
-                income_dict = {}
-                for row in income_rows:
-                    member = row['member'] if isinstance(row, dict) else row[0]
-                    month = row['month'] if isinstance(row, dict) else row[2]
-                    income = row['total_income'] if isinstance(row, dict) else row[3]
-                    income_dict[(member, month)] = float(income or 0)
-                
-                # Create dict of {(member, month): allocated}
-                alloc_dict = {}
-                for row in alloc_rows:
-                    member = row['member'] if isinstance(row, dict) else row[0]
-                    month = row['month'] if isinstance(row, dict) else row[2]
-                    allocated = row['total_allocated'] if isinstance(row, dict) else row[3]
-                    alloc_dict[(member, month)] = float(allocated or 0)
-                
-                # Combine to calculate liquidity
-                all_keys = set(income_dict.keys()) | set(alloc_dict.keys())
-                for (member, month) in all_keys:
-                    income = income_dict.get((member, month), 0)
-                    allocated = alloc_dict.get((member, month), 0)
-                    liquidity = income - allocated
-                    data.append({'month': month, 'member': member, 'liquidity': liquidity})
+                owner_filter = f'u.household_id = {self._ph}'
+                owner = household_id
             else:
-                # For members
-                income_dict = {}
-                for row in income_rows:
-                    month = row['month'] if isinstance(row, dict) else row[0]
-                    income = row['total_income'] if isinstance(row, dict) else row[1]
-                    income_dict[month] = float(income or 0)
-                
-                alloc_dict = {}
-                for row in alloc_rows:
-                    month = row['month'] if isinstance(row, dict) else row[0]
-                    allocated = row['total_allocated'] if isinstance(row, dict) else row[1]
-                    alloc_dict[month] = float(allocated or 0)
-                
-                all_months = set(income_dict.keys()) | set(alloc_dict.keys())
-                for month in all_months:
-                    income = income_dict.get(month, 0)
-                    allocated = alloc_dict.get(month, 0)
-                    liquidity = income - allocated
-                    data.append({'month': int(month), 'liquidity': liquidity})
-            
-            return pd.DataFrame(data)
-        except Exception as e:
-            print(f"Error in get_monthly_liquidity_by_member_simple: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return pd.DataFrame()
+                owner_filter = f'ml.user_id = {self._ph}'
+                owner = user_id
+            
+            df = pd.read_sql_query(f'''
+                SELECT ml.year, ml.user_id, ml.month, u.full_name as member, ml.income - ml.allocated as liquidity
+                FROM monthly_liquidity ml
+                JOIN users u ON u.id = ml.user_id
+                WHERE {owner_filter} AND ml.year IN ({year_list})
+                  AND (ml.income_rows > 0 OR ml.alloc_rows > 0)
+                ORDER BY ml.year, ml.month
+            ''', conn_to_use, params=(owner, *years))
+        except Exception as e:
+            logger.error("Error prefetching liquidity: %s", e)
+            return
+        
+        df['month'] = df['month'].astype(int)
+        df['liquidity'] = df['liquidity'].astype(float)
+        version = (self._ver['income'], self._ver['allocations'])
+        now = time.time()
+        
+        # Slice the household result into the same entries get_monthly_liquidity_by_member_simple would cache
+        entries = {}
+        for year, year_df in df.groupby('year'):
+            year = int(year)
+            if is_admin:
+                entries[(household_id, year, user_id, True)] = year_df[['month', 'member', 'liquidity']]
+            for member_id, member_df in year_df.groupby('user_id'):
+                if is_admin or int(member_id) == user_id:
+                    entries[(household_id, year, int(member_id), False)] = member_df[['month', 'liquidity']]
+        
+        for key, entry in entries.items():
+            cache_key = key + version
+            self._liq_cache[cache_key] = (now, entry.reset_index(drop=True))
+            self._liq_cache.move_to_end(cache_key)
+        while len(self._liq_cache) > LIQUIDITY_CACHE_SIZE:
+            self._liq_cache.popitem(last=False)
     
     
     def get_household_admin(self, household_id):
-        """Get the admin user for a household"""
+        """Get the admin user for a household (cached for ADMIN_CACHE_TTL seconds)"""
+        fetched_at, admin = self._admin_cache.get(household_id, (0, None))
+        if time.time() - fetched_at < ADMIN_CACHE_TTL:
+            return admin
+        return self.get_household_admins([household_id]).get(household_id)
+    
+    def get_household_admins(self, household_ids):
+        """Get the admin user of several households in one query, keyed by household_id"""
+        household_ids = list(household_ids)
+        if not household_ids:
+            return {}
         try:
             cursor = self.conn.cursor()
-            self._execute(cursor, '''
-                SELECT id, full_name, email, role, household_id, relationship
+            if self.use_postgres:
+                # psycopg2 adapts a Python list to an array
+                household_filter, params = 'household_id = ANY(?)', (household_ids,)
+            else:
+                household_filter, params = f"household_id IN ({', '.join('?' * len(household_ids))})", tuple(household_ids)
+            self._execute(cursor, f'''
+                SELECT id, full_name, email, household_id, relationship
                 FROM users
-                WHERE household_id = %s AND role = 'admin'
-                LIMIT 1
-            ''', (household_id,))
+                WHERE {household_filter} AND role = 'admin'
+                ORDER BY id
+            ''', params)
             
-            result = cursor.fetchone()
-            if result:
-                return {
-                    'id': result['id'] if isinstance(result, dict) else result[0],
-                    'full_name': result['full_name'] if isinstance(result, dict) else result[1],
-                    'email': result['email'] if isinstance(result, dict) else result[2],
-                    'role': result['role'] if isinstance(result, dict) else result[3],
-                    'household_id': result['household_id'] if isinstance(result, dict) else result[4],
-                    'relationship': result['relationship'] if isinstance(result, dict) else result[5]
-                }
-            return None
+            # role is fixed by the WHERE clause, so it is filled in rather than fetched
+            admins = {}
+            for row in cursor.fetchall():
+                admins.setdefault(row['household_id'], dict(row, role='admin'))
+            
+            fetched_at = time.time()
+            for household_id in household_ids:
+                self._admin_cache[household_id] = (fetched_at, admins.get(household_id))
+            return admins
         except Exception as e:
-            print(f"Error getting household admin: {str(e)}")
-            return None
+            logger.error("Error getting household admins: %s", e)
+            return {}